@@ -0,0 +1,63 @@
+# Compare the prefix-sum CosineCost against the original submatrix-sum cost
+# on random count matrices of increasing size.
+#
+#     python -m benchmarks.cosine_cost
+
+import sys
+import time
+
+import numpy as np
+import ruptures as rpt
+
+from ruptures.base import BaseCost
+from ruptures.exceptions import NotEnoughPoints
+from sklearn.metrics.pairwise import cosine_similarity
+
+from src.segmentation import CosineCost
+
+
+class SubmatrixCosineCost(BaseCost):
+    # Reference implementation: sums a slice of the Gram matrix per call
+    model = "custom_cosine_submatrix"
+    min_size = 2
+
+    def fit(self, signal):
+        self.signal = signal
+        self.gram = cosine_similarity(signal, dense_output=False)
+        return self
+
+    def error(self, start, end) -> float:
+        if end - start < self.min_size:
+            raise NotEnoughPoints
+        sub_gram = self.gram[start:end, start:end]
+        val = sub_gram.diagonal().sum()
+        val -= sub_gram.sum() / (end - start)
+        return val
+
+
+def random_counts(n_lines, n_glyphs=300, glyphs_per_line=40, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n_lines, n_glyphs))
+    for i in range(n_lines):
+        np.add.at(X[i], rng.integers(0, n_glyphs, glyphs_per_line), 1)
+    return X
+
+
+def time_dynp(cost, X, n_bkps):
+    start = time.perf_counter()
+    bkps = rpt.Dynp(custom_cost=cost, min_size=1, jump=2).fit(X).predict(n_bkps=n_bkps)
+    return time.perf_counter() - start, bkps
+
+
+def main(sizes=(15, 200, 400)):
+    print(f"{'lines':>6} {'submatrix (s)':>14} {'prefix sum (s)':>15} {'speedup':>8}")
+    for n_lines in sizes:
+        X = random_counts(n_lines)
+        old_time, old_bkps = time_dynp(SubmatrixCosineCost(), X, 2)
+        new_time, new_bkps = time_dynp(CosineCost(), X, 2)
+        assert old_bkps == new_bkps
+        print(f"{n_lines:>6} {old_time:>14.3f} {new_time:>15.3f} {old_time / new_time:>8.1f}")
+
+
+if __name__ == '__main__':
+    main(tuple(int(arg) for arg in sys.argv[1:]) or (15, 200, 400))
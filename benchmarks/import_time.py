@@ -0,0 +1,75 @@
+# Checks that importing the analysis modules stays cheap: each module is
+# imported in a fresh interpreter, and the check fails if it takes longer
+# than the budget or loads one of the heavy dependencies, which should only
+# be imported on first use.
+#
+#     python -m benchmarks.import_time
+#     python -m benchmarks.import_time --budget 200 src.segmentation
+
+import argparse
+import json
+import subprocess
+import sys
+
+
+MODULES = [
+    'src.processing',
+    'src.collocations',
+    'src.nearest_neighbor',
+    'src.segmentation',
+    'src.discourse',
+    'src.query',
+    'src.alignment',
+    'src.cache',
+    'src.batch',
+    'src.figures',
+]
+HEAVY_MODULES = ['matplotlib', 'ruptures', 'sklearn', 'scipy.stats', 'nltk', 'pandas']
+# Milliseconds; numpy alone takes a good part of this
+BUDGET_MS = 250
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': 1000 * elapsed, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module, repeat=3):
+    # Best of several fresh interpreters, and the heavy modules it loaded
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        res = json.loads(output)
+        if best is None or res['ms'] < best['ms']:
+            best = res
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of the analysis modules.")
+    parser.add_argument('modules', nargs='*', metavar='module', help="modules to check (default: all)")
+    parser.add_argument('--budget', type=float, default=BUDGET_MS, help="maximum import time in milliseconds")
+    parser.add_argument('--repeat', type=int, default=3, help="fresh interpreters per module; the best time is kept")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'module':<24} {'import (ms)':>12}  heavy dependencies loaded")
+    for module in args.modules or MODULES:
+        res = measure(module, args.repeat)
+        over = res['ms'] > args.budget
+        failed |= over or bool(res['heavy'])
+        status = ', '.join(res['heavy']) or '-'
+        if over:
+            status += f"  OVER BUDGET ({args.budget:.0f} ms)"
+        print(f"{module:<24} {res['ms']:>12.1f}  {status}")
+    return int(failed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# Times the public analysis functions on synthetic tablets at several
+# multiples of the size of text I, and compares against a stored baseline.
+#
+#     python -m benchmarks.suite                  # 1x, 10x, 100x
+#     python -m benchmarks.suite --save           # record a new baseline
+#     python -m benchmarks.suite --scales 1 10 --tolerance 1.5
+#
+# A case is flagged as a regression when its best time exceeds the baseline
+# by more than the tolerance factor; the exit status is then 1. Baselines
+# are machine-specific, so record one on the machine that compares to it.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from .synthetic import write_tablet
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SCALES = (1, 10, 100)
+# Timings shorter than this are too noisy to call a regression
+MIN_SECONDS = 0.005
+
+
+def prepare(data_dir, scale, seed=0):
+    from src.nearest_neighbor import analyze_glyphs
+    from src.processing import clean_lines, encode_lines, load_file, process_sequences
+    from src.segmentation import vectorize
+
+    csv_path, stanzas_path = write_tablet(data_dir, scale=scale, seed=seed)
+    encoded_lines = encode_lines(clean_lines(load_file(csv_path)))
+    encoded_stanzas = encode_lines(clean_lines(load_file(stanzas_path)))
+    _, sequences = process_sequences(encoded_stanzas)
+    vectorized_text, _ = vectorize(encoded_lines)
+    clustered_glyphs, _ = analyze_glyphs(encoded_lines)
+    return {
+        'csv_path': csv_path,
+        'stanzas_path': stanzas_path,
+        'encoded_lines': encoded_lines,
+        'encoded_stanzas': encoded_stanzas,
+        'sequences': sequences,
+        'vectorized_text': vectorized_text,
+        'clustered_glyphs': clustered_glyphs,
+    }
+
+
+def cases():
+    # name -> function of the prepared inputs; each runs one public function
+    from src.collocations import get_bigram_collocations, get_similar_glyphs, get_trigram_collocations
+    from src.discourse import discourse_profile
+    from src.nearest_neighbor import analyze_glyphs
+    from src.processing import clean_lines, encode_lines, load_file, process_sequences
+    from src.query import find_stanzas
+    from src.segmentation import compute_breakpoints, get_segment_distinctive_glyphs, vectorize
+    from src.vectorization import _matrix_cache
+
+    def vectorize_uncached(lines):
+        # vectorize memoizes on the corpus; time the actual counting
+        _matrix_cache.clear()
+        return vectorize(lines)
+
+    return {
+        'load_clean_encode': lambda d: encode_lines(clean_lines(load_file(d['csv_path']))),
+        'process_sequences': lambda d: process_sequences(d['encoded_stanzas']),
+        'get_bigram_collocations': lambda d: get_bigram_collocations(d['sequences']),
+        'get_trigram_collocations': lambda d: get_trigram_collocations(d['sequences']),
+        'get_similar_glyphs': lambda d: get_similar_glyphs(d['sequences']),
+        'find_stanzas': lambda d: find_stanzas('X <76> _ X', d['sequences']),
+        'analyze_glyphs': lambda d: analyze_glyphs(d['encoded_lines']),
+        'vectorize': lambda d: vectorize_uncached(d['encoded_lines']),
+        'compute_breakpoints': lambda d: compute_breakpoints(d['vectorized_text'], [1, 2]),
+        'get_segment_distinctive_glyphs': lambda d: get_segment_distinctive_glyphs(
+            d['encoded_lines'], [len(d['encoded_lines']) // 2, len(d['encoded_lines'])]
+        ),
+        'discourse_profile': lambda d: discourse_profile(d['clustered_glyphs'], d['encoded_lines']),
+    }
+
+
+def best_time(func, data, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(scales=SCALES, repeat=3, names=None, seed=0):
+    # {'<case>@<scale>x': seconds}
+    all_cases = cases()
+    names = names or list(all_cases)
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        for scale in scales:
+            data = prepare(os.path.join(data_dir, f'{scale}x'), scale, seed)
+            for name in names:
+                results[f'{name}@{scale}x'] = best_time(all_cases[name], data, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Rows of (key, seconds, baseline seconds or None, status)
+    rows = []
+    for key, seconds in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            status = 'new'
+        elif seconds > tolerance * reference and seconds > MIN_SECONDS:
+            status = 'REGRESSION'
+        else:
+            status = 'ok'
+        rows.append((key, seconds, reference, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis functions on synthetic tablets.")
+    parser.add_argument('cases', nargs='*', metavar='case', help="cases to run (default: all)")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES), help="corpus sizes as multiples of text I")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case; the best time is kept")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic tablets")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="slowdown factor flagged as a regression")
+    parser.add_argument('--save', action='store_true', help="store these timings as the baseline")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.cases if name not in cases()]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    results = run(args.scales, args.repeat, args.cases, args.seed)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    rows = compare(results, baseline, args.tolerance)
+    print(f"{'case':<40} {'time (s)':>10} {'baseline':>10} {'ratio':>7}  status")
+    for key, seconds, reference, status in rows:
+        ratio = f'{seconds / reference:>7.2f}' if reference else f"{'-':>7}"
+        reference = f'{reference:>10.4f}' if reference is not None else f"{'-':>10}"
+        print(f"{key:<40} {seconds:>10.4f} {reference} {ratio}  {status}")
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    return int(any(status == 'REGRESSION' for *_, status in rows))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# Synthetic tablets in the formats of data/, for benchmarking at sizes the
+# real texts cannot reach. Scale 1 is roughly the size of text I: 14 lines
+# of about 36 stanzas each, every stanza a glyph ligatured with the stanza
+# marker 076 followed by two or three glyphs.
+#
+#     python -m benchmarks.synthetic out_dir --scale 10 --seed 0
+
+import argparse
+import os
+
+import numpy as np
+
+
+SUFFIXES = ['', '', '', '', 'f', 's', 'V', 'y', 'h', 'a', 't', 'x']
+N_LINES = 14
+STANZAS_PER_LINE = 36
+VOCAB_SIZE = 400
+ZIPF_EXPONENT = 1.1
+
+
+class TabletGenerator:
+    # Glyphs are drawn from a Zipf-distributed Barthel vocabulary, with the
+    # occasional '.' or ':' ligature, uncertain reading (?) and 999 filler
+    # that the cleaning rules remove
+
+    def __init__(self, seed=0, vocab_size=VOCAB_SIZE):
+        self.rng = np.random.default_rng(seed)
+        codes = self.rng.choice(np.arange(1, 800), size=vocab_size, replace=False)
+        self.vocab = [f'{code:03d}{self.rng.choice(SUFFIXES)}' for code in codes]
+        weights = 1 / np.arange(1, vocab_size + 1) ** ZIPF_EXPONENT
+        self.weights = weights / weights.sum()
+
+    def glyph(self):
+        rng = self.rng
+        glyph = self.vocab[rng.choice(len(self.vocab), p=self.weights)]
+        roll = rng.random()
+        if roll < 0.08:
+            glyph += '.' + self.vocab[rng.choice(len(self.vocab), p=self.weights)]
+        elif roll < 0.11:
+            glyph += ':' + self.vocab[rng.choice(len(self.vocab), p=self.weights)]
+        if rng.random() < 0.04:
+            glyph += '?'
+        return glyph
+
+    def stanza(self):
+        glyphs = [self.glyph() + '.076'] + [self.glyph() for _ in range(self.rng.integers(2, 4))]
+        if self.rng.random() < 0.05:
+            glyphs.insert(int(self.rng.integers(1, len(glyphs) + 1)), '999')
+        return '-'.join(glyphs)
+
+    def lines(self, n_lines, stanzas_per_line=STANZAS_PER_LINE):
+        return [[self.stanza() for _ in range(stanzas_per_line)] for _ in range(n_lines)]
+
+
+def write_tablet(out_dir, name='I', scale=1, seed=0):
+    # Writes <name>.csv (one row per line) and <name>_stanzas.txt (one
+    # stanza per line) holding the same text; returns both paths
+    lines = TabletGenerator(seed).lines(N_LINES * scale)
+    os.makedirs(out_dir, exist_ok=True)
+    csv_path = os.path.join(out_dir, f'{name}.csv')
+    stanzas_path = os.path.join(out_dir, f'{name}_stanzas.txt')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as file:
+        for i, stanzas in enumerate(lines):
+            file.write(f"{name}{len(lines) - i:02d},{'-'.join(stanzas)}\n")
+    with open(stanzas_path, 'w', encoding='utf-8', newline='') as file:
+        for stanzas in lines:
+            for stanza in stanzas:
+                file.write(stanza + '\n')
+    return csv_path, stanzas_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic tablet in the data/ formats.")
+    parser.add_argument('out_dir', help="output directory")
+    parser.add_argument('--name', default='I', help="tablet name used for the file names")
+    parser.add_argument('--scale', type=int, default=1, help="size as a multiple of text I")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    args = parser.parse_args(argv)
+    for path in write_tablet(args.out_dir, args.name, args.scale, args.seed):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+from .batch import main
+
+
+main()
@@ -0,0 +1,238 @@
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .corpus import Corpus
+
+
+# Parallel passages between tablets by local alignment (Smith-Waterman with
+# a linear gap penalty). Identical glyphs score MATCH; distinct glyphs that
+# share sub-glyphs in the Horley encoding (e.g. 200.6 and 6) score SIMILAR
+# scaled by the Jaccard similarity of their components; others MISMATCH.
+# Only windows around shared k-mers of legible glyphs (seeds) are aligned,
+# never whole texts.
+MATCH = 2.0
+SIMILAR = 1.0
+MISMATCH = -1.0
+GAP = 2.0
+
+PASSAGE_DTYPE = [
+    ('query', object),
+    ('target', object),
+    ('score', np.float64),
+    ('length', np.int64),
+    ('identity', np.float64),
+    ('query_start', np.int64),
+    ('query_end', np.int64),
+    ('query_line', np.int64),
+    ('query_column', np.int64),
+    ('target_start', np.int64),
+    ('target_end', np.int64),
+    ('target_line', np.int64),
+    ('target_column', np.int64),
+    ('query_glyphs', object),
+    ('target_glyphs', object),
+]
+
+
+def substitution_matrix(corpus, match=MATCH, similar=SIMILAR, mismatch=MISMATCH):
+    # Vocabulary x vocabulary scores from the glyph x component matrix
+    components = corpus.component_matrix().astype(np.float64)
+    shared = (components @ components.T).toarray()
+    sizes = np.diff(components.indptr)
+    union = sizes[:, None] + sizes[None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    scores = np.where(jaccard > 0, similar * jaccard, mismatch)
+    np.fill_diagonal(scores, match)
+    return scores
+
+
+def kmer_keys(ids, k, size):
+    # Integer key of the k-mer starting at every position
+    length = len(ids) - k + 1
+    if length <= 0:
+        return np.array([], dtype=np.int64)
+    keys = np.zeros(length, dtype=np.int64)
+    for j in range(k):
+        keys = keys * size + ids[j:j + length]
+    return keys
+
+
+def seed_hits(query, target, k, size, unreadable=None):
+    # (query position, target position) of every k-mer the texts share,
+    # ordered by query position then target position. k-mers with a glyph
+    # flagged in unreadable (such as uncertain ? readings) never seed.
+    query_keys = kmer_keys(query, k, size)
+    target_keys = kmer_keys(target, k, size)
+    if unreadable is not None:
+        query_keys[kmer_keys(unreadable[query].astype(np.int64), k, 2) > 0] = -1
+        target_keys[kmer_keys(unreadable[target].astype(np.int64), k, 2) > 0] = -2
+    order = np.argsort(target_keys, kind='stable')
+    sorted_keys = target_keys[order]
+    lo = np.searchsorted(sorted_keys, query_keys, side='left')
+    hi = np.searchsorted(sorted_keys, query_keys, side='right')
+    n_hits = hi - lo
+    query_positions = np.repeat(np.arange(len(query_keys)), n_hits)
+    ranks = np.arange(n_hits.sum()) - np.repeat(np.cumsum(n_hits) - n_hits, n_hits)
+    target_positions = order[np.repeat(lo, n_hits) + ranks]
+    return query_positions, target_positions
+
+
+def smith_waterman(query, target, scores, gap=GAP):
+    # Best local alignment of two ID arrays, as (score, query start, query
+    # end, target start, target end, matched pairs) with exclusive ends.
+    # Each DP row is computed at once: with a linear gap the horizontal
+    # moves reduce to a running maximum of (row + gap * column).
+    n, m = len(query), len(target)
+    substitution = scores[np.ix_(query, target)]
+    H = np.zeros((n + 1, m + 1))
+    ramp = gap * np.arange(m + 1)
+    row = np.zeros(m + 1)
+    for i in range(1, n + 1):
+        np.maximum(H[i - 1, :-1] + substitution[i - 1], H[i - 1, 1:] - gap, out=row[1:])
+        np.maximum(row, 0, out=row)
+        row += ramp
+        np.maximum.accumulate(row, out=H[i])
+        H[i] -= ramp
+
+    i, j = np.unravel_index(np.argmax(H), H.shape)
+    best = H[i, j]
+    end_i, end_j = i, j
+    pairs = []
+    while i > 0 and j > 0 and H[i, j] > 0:
+        if np.isclose(H[i, j], H[i - 1, j - 1] + substitution[i - 1, j - 1]):
+            pairs.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif np.isclose(H[i, j], H[i - 1, j] - gap):
+            i -= 1
+        else:
+            j -= 1
+    return float(best), int(i), int(end_i), int(j), int(end_j), pairs[::-1]
+
+
+def align_window(query, target, q, t, scores, k, window, max_window, gap):
+    # Aligns the window around the seed at (q, t), widening it while the
+    # best alignment runs into a window edge that is not a text end
+    while True:
+        q_lo, t_lo = max(q - window, 0), max(t - window, 0)
+        q_hi, t_hi = min(q + k + window, len(query)), min(t + k + window, len(target))
+        score, q_start, q_end, t_start, t_end, pairs = smith_waterman(query[q_lo:q_hi], target[t_lo:t_hi], scores, gap)
+        q_start, q_end, t_start, t_end = q_lo + q_start, q_lo + q_end, t_lo + t_start, t_lo + t_end
+        clipped = (
+            (q_start == q_lo > 0) or (t_start == t_lo > 0)
+            or (q_end == q_hi < len(query)) or (t_end == t_hi < len(target))
+        )
+        if not clipped or window >= max_window:
+            return score, q_start, q_end, t_start, t_end, [(q_lo + a, t_lo + b) for a, b in pairs]
+        window *= 2
+
+
+def align_seeds(query, target, scores, k=3, window=20, gap=GAP, min_score=3 * MATCH, unreadable=None, max_window=320):
+    # Aligns a window around each seed. Seeds come in query order, so only
+    # alignments still open at the seed's query position can contain it;
+    # seeds inside one of those are skipped. Overlapping alignments keep
+    # the best one.
+    res = []
+    active = []
+    for q, t in zip(*seed_hits(query, target, k, scores.shape[0], unreadable)):
+        active = [alignment for alignment in active if alignment[2] > q]
+        if any(q_start <= q and t_start <= t < t_end for _, q_start, _, t_start, t_end, _ in active):
+            continue
+        alignment = align_window(query, target, q, t, scores, k, window, max_window, gap)
+        if alignment[0] >= min_score:
+            res.append(alignment)
+            active.append(alignment)
+
+    # Kept alignments are indexed by query start; none is longer than
+    # longest, so only those starting in [q_start - longest, q_end) can overlap
+    res.sort(key=lambda x: (-x[0], x[1], x[3]))
+    longest = max((alignment[2] - alignment[1] for alignment in res), default=0)
+    kept = []
+    starts = []
+    by_start = []
+    for alignment in res:
+        _, q_start, q_end, t_start, t_end, _ = alignment
+        lo = bisect_left(starts, q_start - longest)
+        hi = bisect_left(starts, q_end)
+        if not any(q_start < other[2] and t_start < other[4] and other[3] < t_end for other in by_start[lo:hi]):
+            kept.append(alignment)
+            position = bisect_left(starts, q_start)
+            starts.insert(position, q_start)
+            by_start.insert(position, alignment)
+    return kept
+
+
+# Substitution scores and unreadable flags shared by every comparison. They
+# are sent to each worker process once, through the pool initializer,
+# rather than with every task.
+_shared = {}
+
+
+def _init_worker(scores, unreadable):
+    _shared['scores'] = scores
+    _shared['unreadable'] = unreadable
+
+
+def _align_worker(args):
+    query_name, target_name, query, target, k, window, gap, min_score, max_window = args
+    return query_name, target_name, align_seeds(
+        query, target, _shared['scores'], k, window, gap, min_score, _shared['unreadable'], max_window
+    )
+
+
+def find_parallel_passages(tablets, query=None, k=3, window=20, min_score=3 * MATCH, match=MATCH,
+                           similar=SIMILAR, mismatch=MISMATCH, gap=GAP, max_window=320, n_jobs=None):
+    # tablets maps a name to its encoded lines (or a Corpus). The query
+    # tablet is searched against every other one; with query=None every
+    # pair of tablets is compared once. Passages may run across line ends.
+    # Returns a PASSAGE_DTYPE array ranked by score; starts and ends are
+    # flat glyph positions within each tablet, ends exclusive.
+    names = list(tablets)
+    lines = {name: tablets[name].to_lines() if isinstance(tablets[name], Corpus) else tablets[name] for name in names}
+    corpus = Corpus([line for name in names for line in lines[name]])
+    scores = substitution_matrix(corpus, match, similar, mismatch)
+    unreadable = np.array(['?' in glyph for glyph in corpus.vocab], dtype=bool)
+
+    bounds = np.cumsum([0] + [len(lines[name]) for name in names])
+    texts, offsets = {}, {}
+    for name, first, last in zip(names, bounds[:-1], bounds[1:]):
+        start = corpus.offsets[first]
+        texts[name] = corpus.glyphs[start:corpus.offsets[last]]
+        offsets[name] = corpus.offsets[first:last + 1] - start
+
+    if query is None:
+        pairs = [(a, b) for i, a in enumerate(names) for b in names[i + 1:]]
+    elif query not in tablets:
+        raise ValueError(f"Unknown tablet: {query}")
+    else:
+        pairs = [(query, name) for name in names if name != query]
+    tasks = [(a, b, texts[a], texts[b], k, window, gap, min_score, max_window) for a, b in pairs]
+    if n_jobs == 1 or len(tasks) < 2:
+        _init_worker(scores, unreadable)
+        try:
+            results = list(map(_align_worker, tasks))
+        finally:
+            _shared.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(scores, unreadable)) as executor:
+            results = list(executor.map(_align_worker, tasks))
+
+    rows = []
+    for query_name, target_name, alignments in results:
+        for score, q_start, q_end, t_start, t_end, matched in alignments:
+            q_line = np.searchsorted(offsets[query_name], q_start, side='right') - 1
+            t_line = np.searchsorted(offsets[target_name], t_start, side='right') - 1
+            identical = sum(texts[query_name][a] == texts[target_name][b] for a, b in matched)
+            rows.append((
+                query_name, target_name, score, max(q_end - q_start, t_end - t_start),
+                identical / max(q_end - q_start, t_end - t_start),
+                q_start, q_end, q_line, q_start - offsets[query_name][q_line],
+                t_start, t_end, t_line, t_start - offsets[target_name][t_line],
+                ' '.join(corpus.decode(texts[query_name][q_start:q_end])),
+                ' '.join(corpus.decode(texts[target_name][t_start:t_end])),
+            ))
+
+    res = np.array(rows, dtype=PASSAGE_DTYPE)
+    order = np.lexsort((res['target_start'], res['query_start'], -res['score']))
+    return res[order]
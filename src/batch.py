@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+def load_lines(file_path, use_cache=False):
+    # Encoded lines of a <name>.csv file
+    if use_cache:
+        from .cache import cached_corpus
+
+        return cached_corpus(file_path).to_lines()
+
+    from .processing import clean_lines, encode_lines, load_file
+
+    return encode_lines(clean_lines(load_file(file_path)))
+
+
+def load_sequences(file_path, use_cache=False):
+    # Filtered stanza sequences of a <name>_stanzas.txt file
+    if use_cache:
+        from .cache import cached_corpus
+
+        return cached_corpus(file_path, sequences=True).to_lines()
+
+    from .processing import clean_lines, encode_lines, load_file, process_sequences
+
+    _, sequences = process_sequences(encode_lines(clean_lines(load_file(file_path))))
+    return sequences
+
+
+def analyze_tablet(name, lines_path=None, stanzas_path=None, n_bkps=(1, 2), top_n=10, min_count=4, use_cache=False):
+    # As in the notebook: collocations and similar glyphs on the stanza
+    # file, nearest-neighbour clustering and segmentation on the line file.
+    # Analyses whose file is missing are left out of the result.
+    res = {'tablet': name, 'files': {'lines': lines_path, 'stanzas': stanzas_path}}
+
+    if stanzas_path is not None:
+        from .collocations import get_bigram_collocations, get_similar_glyphs, get_trigram_collocations
+
+        sequences = load_sequences(stanzas_path, use_cache)
+        res['n_sequences'] = len(sequences)
+        if sequences:
+            res['bigrams'] = get_bigram_collocations(sequences, top_n=top_n)
+            res['bigrams_frequency'] = get_bigram_collocations(sequences, measure='frequency', top_n=top_n)
+            res['trigrams'] = get_trigram_collocations(sequences, top_n=top_n)
+            res['trigrams_frequency'] = get_trigram_collocations(sequences, measure='frequency', top_n=top_n)
+            res['similar_glyphs'] = get_similar_glyphs(sequences)[1]
+
+    if lines_path is not None:
+        from .nearest_neighbor import analyze_glyphs
+        from .segmentation import compute_breakpoints, get_segment_distinctive_glyphs, vectorize
+
+        encoded_lines = load_lines(lines_path, use_cache)
+        res['n_lines'] = len(encoded_lines)
+        res['n_glyphs'] = sum(len(line) for line in encoded_lines)
+
+        clustered, dispersed = analyze_glyphs(encoded_lines, min_count=min_count)
+        res['clustered'] = [glyph[0] for glyph in clustered]
+        res['dispersed'] = [glyph[0] for glyph in dispersed]
+
+        n_bkps = [n for n in n_bkps if n < len(encoded_lines) // 2]
+        gram = None
+        if use_cache:
+            from .cache import cached_count_matrix, cached_gram
+
+            vectorized_text, _ = cached_count_matrix(lines_path)
+            if n_bkps and vectorized_text.shape[1] > 0:
+                gram = cached_gram(lines_path)
+        else:
+            vectorized_text, _ = vectorize(encoded_lines)
+        if n_bkps and vectorized_text.shape[1] > 0:
+            breakpoints, costs, _ = compute_breakpoints(vectorized_text, n_bkps, gram=gram)
+            res['segmentation'] = [
+                {
+                    'n_bkps': n,
+                    'breakpoints': bkps,
+                    'cost': float(cost),
+                    'distinctive_glyphs': get_segment_distinctive_glyphs(encoded_lines, bkps, top_n),
+                }
+                for n, bkps, cost in zip(n_bkps, breakpoints, costs)
+            ]
+    return res
+
+
+def to_json(value):
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _analyze_worker(args):
+    return analyze_tablet(*args)
+
+
+def run(tablets, out_dir=None, n_jobs=None, n_bkps=(1, 2), top_n=10, min_count=4, use_cache=False):
+    # tablets maps a name to its {'lines': path, 'stanzas': path} files
+    tasks = [
+        (name, files['lines'], files['stanzas'], tuple(n_bkps), top_n, min_count, use_cache)
+        for name, files in tablets.items()
+    ]
+    if n_jobs == 1 or len(tasks) < 2:
+        results = [to_json(res) for res in map(_analyze_worker, tasks)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = [to_json(res) for res in executor.map(_analyze_worker, tasks)]
+
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        for res in results:
+            with open(os.path.join(out_dir, f"{res['tablet']}.json"), 'w', encoding='utf-8') as file:
+                json.dump(res, file, indent=2)
+    return results
+
+
+def expand_paths(paths):
+    # Groups tablet files by tablet; directories contribute only files named
+    # <name>.csv or <name>_stanzas.txt. Raises ValueError for a file given
+    # explicitly that does not follow that naming.
+    from .processing import tablet_file, tablet_files
+
+    tablets = {}
+    for path in paths:
+        if os.path.isdir(path):
+            found = tablet_files(path)
+        else:
+            match = tablet_file(path)
+            if match is None:
+                raise ValueError(f"Not a tablet file (expected <name>.csv or <name>_stanzas.txt): {path}")
+            name, kind = match
+            found = {name: {'lines': None, 'stanzas': None, kind: path}}
+        for name, files in found.items():
+            entry = tablets.setdefault(name, {'lines': None, 'stanzas': None})
+            entry.update({kind: file_path for kind, file_path in files.items() if file_path is not None})
+    return tablets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src', description="Run the tablet analyses in batch.")
+    parser.add_argument('paths', nargs='+', help="tablet files (<name>.csv, <name>_stanzas.txt) or directories of them")
+    parser.add_argument('--out', default=None, help="directory for one JSON result file per tablet (default: print JSON)")
+    parser.add_argument('--jobs', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--bkps', type=int, nargs='+', default=[1, 2], help="breakpoint counts for segmentation")
+    parser.add_argument('--top', type=int, default=10, help="number of collocations and distinctive glyphs")
+    parser.add_argument('--min-count', type=int, default=4, help="minimum glyph count for clustering")
+    parser.add_argument('--cache', action='store_true', help="reuse encoded corpora from the on-disk cache")
+    parser.add_argument('--profile', default=None, metavar='TRACE', help="run in one process and write a JSON stage trace")
+    args = parser.parse_args(argv)
+
+    try:
+        tablets = expand_paths(args.paths)
+    except ValueError as error:
+        parser.error(str(error))
+    if not tablets:
+        parser.error("no tablet files found")
+    if args.profile is None:
+        results = run(tablets, args.out, args.jobs, args.bkps, args.top, args.min_count, args.cache)
+    else:
+        from .profiling import profile
+
+        with profile() as profiler:
+            results = run(tablets, args.out, 1, args.bkps, args.top, args.min_count, args.cache)
+        profiler.save_trace(args.profile)
+        print(profiler.report(), file=sys.stderr)
+    if args.out is None:
+        print(json.dumps(results, indent=2))
+    else:
+        for res in results:
+            summary = []
+            if 'n_lines' in res:
+                summary.append(f"{res['n_lines']} lines, {len(res['clustered'])} clustered glyphs")
+            if 'n_sequences' in res:
+                summary.append(f"{res['n_sequences']} stanzas")
+            print(f"{res['tablet']}: {', '.join(summary)}")
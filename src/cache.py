@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .corpus import Corpus
+from .horley_encoding import horley_encoding
+from .processing import REPLACEMENTS, clean_lines, encode_lines, load_file, process_sequences
+
+
+# Intermediate artifacts (encoded corpora, count matrices, Gram matrices)
+# stored on disk under a hash of the input file, the encoding table, the
+# cleaning rules and the code that applies them. Editing any of these gives
+# new keys, so stale entries are simply never read again.
+CACHE_DIR = os.environ.get('SANTIAGO_STAFF_CACHE', '.santiago_cache')
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+VERSIONED_MODULES = ['horley_encoding.py', 'processing.py', 'corpus.py', 'vectorization.py', 'segmentation.py']
+
+
+def pipeline_hash(rules=REPLACEMENTS):
+    digest = hashlib.sha256()
+    digest.update(json.dumps(horley_encoding, sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(list(rules.items())).encode('utf-8'))
+    for module in VERSIONED_MODULES:
+        with open(os.path.join(SRC_DIR, module), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def artifact_key(file_path, stage, rules=REPLACEMENTS):
+    digest = hashlib.sha256(stage.encode('utf-8'))
+    digest.update(pipeline_hash(rules).encode('utf-8'))
+    with open(file_path, 'rb') as file:
+        digest.update(file.read())
+    return digest.hexdigest()
+
+
+def artifact_path(key, extension, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, f'{key}.{extension}')
+
+
+def atomic_write(path, write):
+    # Write to a temporary file first so concurrent readers never see a
+    # partial artifact
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def save_corpus(path, corpus):
+    atomic_write(path, lambda file: np.savez(
+        file, vocab=np.array(corpus.vocab, dtype=str), glyphs=corpus.glyphs, offsets=corpus.offsets
+    ))
+
+
+def load_corpus(path):
+    with np.load(path) as data:
+        return Corpus.from_arrays(data['vocab'], data['glyphs'], data['offsets'])
+
+
+def cached_corpus(file_path, sequences=False, rules=REPLACEMENTS, cache_dir=None):
+    # load -> clean -> encode (-> process_sequences, keeping the filtered
+    # stanzas, when sequences is True)
+    stage = 'sequences' if sequences else 'lines'
+    path = artifact_path(artifact_key(file_path, stage, rules), 'corpus.npz', cache_dir)
+    if os.path.exists(path):
+        return load_corpus(path)
+
+    encoded = encode_lines(clean_lines(load_file(file_path), rules))
+    if sequences:
+        _, encoded = process_sequences(encoded)
+    corpus = Corpus(encoded)
+    save_corpus(path, corpus)
+    return corpus
+
+
+def cached_count_matrix(file_path, rules=REPLACEMENTS, cache_dir=None):
+    from scipy.sparse import load_npz, save_npz
+
+    from .vectorization import fit_vectorizer
+
+    key = artifact_key(file_path, 'counts', rules)
+    matrix_path = artifact_path(key, 'counts.npz', cache_dir)
+    features_path = artifact_path(key, 'features.npy', cache_dir)
+    if os.path.exists(matrix_path) and os.path.exists(features_path):
+        return load_npz(matrix_path).tocsr(), np.load(features_path)
+
+    vectorizer = fit_vectorizer(cached_corpus(file_path, rules=rules, cache_dir=cache_dir))
+    feature_names = np.array(vectorizer.get_feature_names_out(), dtype=str)
+    atomic_write(features_path, lambda file: np.save(file, feature_names))
+    atomic_write(matrix_path, lambda file: save_npz(file, vectorizer.counts))
+    return vectorizer.counts.copy(), feature_names
+
+
+def cached_gram(file_path, rules=REPLACEMENTS, cache_dir=None):
+    # Dense cosine Gram matrix of the line counts, memory-mapped on reload
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    path = artifact_path(artifact_key(file_path, 'gram', rules), 'gram.npy', cache_dir)
+    if not os.path.exists(path):
+        counts, _ = cached_count_matrix(file_path, rules, cache_dir)
+        gram = cosine_similarity(counts, dense_output=True)
+        atomic_write(path, lambda file: np.save(file, np.asarray(gram)))
+    return np.load(path, mmap_mode='r')
@@ -1,49 +1,175 @@
-from nltk.collocations import BigramAssocMeasures, BigramCollocationFinder, TrigramAssocMeasures, TrigramCollocationFinder
-from nltk.lm.preprocessing import pad_both_ends
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
+import numpy as np
 
-def get_collocations(sequences, ngram_finder_class, assoc_measures_class, ngram_filters, measure='likelihood_ratio', top_n=10):
-    padded = [list(pad_both_ends(sequence, 2)) for sequence in sequences]
-    collocation_measures = assoc_measures_class()
+from .corpus import Corpus, as_lines
+from .ngrams import LOG, NgramCounts, count_ngrams, merge_tables
+from .profiling import profiled
+
+
+BIGRAM_FILTERS = [
+    lambda *w: w[1] != '<76>' or '?' in w[0],
+    lambda *w: w[0] != '<76>' or '?' in w[1],
+    lambda *w: w[-1] != '</s>' or '?' in w[0]
+]
+TRIGRAM_FILTERS = [
+    lambda *w: w[1] != '<76>' or '?' in w[0] or '?' in w[2],
+]
+NGRAM_FILTERS = {2: BIGRAM_FILTERS, 3: TRIGRAM_FILTERS}
+
+
+@profiled
+def score_collocations(counts, ngram_filters, measure='likelihood_ratio', top_n=10, min_freq=2):
+    frequent = counts.counts >= min_freq
+    candidates = np.flatnonzero(frequent)
+    scores = counts.likelihood_ratio(candidates) if measure == 'likelihood_ratio' else None
     results = []
     for ngram_filter in ngram_filters:
-        finder = ngram_finder_class.from_documents(padded)
-        finder.apply_freq_filter(2)
-        finder.apply_ngram_filter(ngram_filter)
+        keep = frequent & counts.mask(ngram_filter, candidates)
         if measure == 'likelihood_ratio':
-            results.extend(finder.score_ngrams(collocation_measures.likelihood_ratio)[:top_n])
+            results.extend((counts.words(i), float(scores[i])) for i in counts.rank(scores, keep)[:top_n])
         elif measure == 'frequency':
-            results.extend(finder.ngram_fd.most_common(top_n))
+            results.extend((counts.words(i), int(counts.counts[i])) for i in counts.most_common(keep)[:top_n])
     return results
 
 
+@profiled
+def get_collocations(sequences, n, ngram_filters, measure='likelihood_ratio', top_n=10, min_freq=2):
+    return score_collocations(count_ngrams(as_lines(sequences), n), ngram_filters, measure, top_n, min_freq)
+
+
+@profiled
 def get_bigram_collocations(sequences, measure='likelihood_ratio', top_n=10):
-    bigram_filters = [
-        lambda *w: w[1] != '<76>' or '?' in w[0],
-        lambda *w: w[0] != '<76>' or '?' in w[1],
-        lambda *w: w[-1] != '</s>' or '?' in w[0]
-    ]
-    return get_collocations(sequences, BigramCollocationFinder, BigramAssocMeasures, bigram_filters, measure, top_n)
+    return get_collocations(sequences, 2, BIGRAM_FILTERS, measure, top_n)
 
 
+@profiled
 def get_trigram_collocations(sequences, measure='likelihood_ratio', top_n=10):
-    trigram_filters = [
-        lambda *w: w[1] != '<76>' or '?' in w[0] or '?' in w[2],
-    ]
-    return get_collocations(sequences, TrigramCollocationFinder, TrigramAssocMeasures, trigram_filters, measure, top_n)
+    return get_collocations(sequences, 3, TRIGRAM_FILTERS, measure, top_n)
+
+
+def _count_worker(args):
+    sequences, n = args
+    return count_ngrams(sequences, n).table()
+
+
+@profiled
+def count_tablets(tablets, n=2, n_jobs=None):
+    # One count table per tablet, counted in parallel
+    tasks = [(as_lines(sequences), n) for sequences in tablets.values()]
+    if n_jobs == 1 or len(tasks) < 2:
+        tables = list(map(_count_worker, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            tables = list(executor.map(_count_worker, tasks))
+    return dict(zip(tablets, tables))
+
+
+def keyness(observed, total, rest_observed, rest_total):
+    # Dunning's log-likelihood G2 for an n-gram's frequency in one tablet
+    # against the other tablets, signed negative where it is under-represented
+    expected = total * (observed + rest_observed) / (total + rest_total)
+    rest_expected = rest_total * (observed + rest_observed) / (total + rest_total)
+    g2 = 2 * (
+        np.where(observed > 0, observed * LOG(np.maximum(observed, 1) / expected).astype(float), 0)
+        + np.where(rest_observed > 0, rest_observed * LOG(np.maximum(rest_observed, 1) / rest_expected).astype(float), 0)
+    )
+    return np.where(observed * rest_total >= rest_observed * total, g2, -g2)
+
+
+@profiled
+def contrast_collocations(pooled, tables, ngram_filters, top_n=10, min_freq=2):
+    # For every tablet, the n-grams most over-represented there relative to
+    # the remaining tablets, scored on the pooled n-gram list
+    ngrams = [pooled.words(i) for i in range(len(pooled.counts))]
+    results = {}
+    for name, table in tables.items():
+        observed = np.array([table['ngrams'].get(ngram, 0) for ngram in ngrams], dtype=np.int64)
+        rest_observed = pooled.counts - observed
+        total = observed.sum()
+        rest_total = rest_observed.sum()
+        results[name] = []
+        if total == 0 or rest_total == 0:
+            continue
+        scores = keyness(observed, total, rest_observed, rest_total)
+        frequent = (observed >= min_freq) & (scores > 0)
+        candidates = np.flatnonzero(frequent)
+        for ngram_filter in ngram_filters:
+            keep = frequent & pooled.mask(ngram_filter, candidates)
+            results[name].extend((pooled.words(i), float(scores[i])) for i in pooled.rank(scores, keep)[:top_n])
+    return results
+
+
+@profiled
+def compare_collocations(tablets, n=2, measure='likelihood_ratio', top_n=10, min_freq=2, ngram_filters=None, n_jobs=None):
+    # tablets maps a name to its sequences, e.g. {'I': ..., 'Gv': ..., 'T': ...}.
+    # Each tablet is counted once; the per-tablet, pooled and contrast views
+    # are all scored from those count tables.
+    if ngram_filters is None:
+        ngram_filters = NGRAM_FILTERS[n]
+    tables = count_tablets(tablets, n, n_jobs)
+    pooled = NgramCounts.from_table(merge_tables(tables.values()))
+    return {
+        'tablets': {
+            name: score_collocations(NgramCounts.from_table(table), ngram_filters, measure, top_n, min_freq)
+            for name, table in tables.items()
+        },
+        'pooled': score_collocations(pooled, ngram_filters, measure, top_n, min_freq),
+        'contrast': contrast_collocations(pooled, tables, ngram_filters, top_n, min_freq),
+    }
+
+
+@lru_cache(maxsize=None)
+def component_set(glyph):
+    return frozenset(glyph.split('.'))
 
 
 def is_similar(glyph1, glyph2):
-    glyph1_set = set(glyph1.split('.'))
-    glyph2_set = set(glyph2.split('.'))
-    return len(glyph1_set.intersection(glyph2_set)) > 0
+    # For many comparisons over one corpus, see Corpus.subglyph_index
+    return not component_set(glyph1).isdisjoint(component_set(glyph2))
+
+
+# Positions compared in each stanza; negative positions count from the end
+SIMILARITY_PATTERNS = {
+    'XYX': (0, -1),
+    'XXZ': (0, 2),
+    'XYY': (2, -1),
+}
+
+
+@profiled
+def similar_glyph_masks(sequences, patterns=SIMILARITY_PATTERNS):
+    # For every pattern, a boolean mask over the sequences marking those
+    # where the glyph at each listed position shares a sub-glyph with the
+    # glyph at the first one. Stanzas too short for a pattern never match.
+    corpus = sequences if isinstance(sequences, Corpus) else Corpus(sequences)
+    components = corpus.component_matrix()
+    matrix, lengths = corpus.padded()
+    rows = np.arange(len(lengths))
+
+    def glyphs_at(position):
+        columns = position if position >= 0 else lengths + position
+        valid = (columns >= 0) & (columns < lengths)
+        return matrix[rows, np.where(valid, columns, 0)], valid
+
+    masks = {}
+    for name, positions in patterns.items():
+        first, mask = glyphs_at(positions[0])
+        for position in positions[1:]:
+            other, valid = glyphs_at(position)
+            shared = np.asarray(components[first].multiply(components[other]).sum(axis=1)).ravel()
+            mask = mask & valid & (shared > 0)
+        masks[name] = mask
+    return masks
 
 
-def get_similar_glyphs(sequences):
+@profiled
+def get_similar_glyphs(sequences, patterns=SIMILARITY_PATTERNS):
+    sequences = as_lines(sequences)
+    masks = similar_glyph_masks(sequences, patterns)
     repeated_sequences = {
-        'XYX': [seq for seq in sequences if is_similar(seq[0], seq[-1])],
-        'XXZ': [seq for seq in sequences if is_similar(seq[0], seq[2])],
-        'XYY': [seq for seq in sequences if is_similar(seq[2], seq[-1])],
+        key: [seq for seq, match in zip(sequences, mask) if match] for key, mask in masks.items()
     }
 
     percentages = {key: len(value) / len(sequences) for key, value in repeated_sequences.items()}
@@ -0,0 +1,135 @@
+import numpy as np
+
+from .index import ComponentIndex, GlyphIndex
+
+
+class Corpus:
+    # Encoded lines stored as a flat array of interned glyph IDs plus line
+    # offsets, so line i is glyphs[offsets[i]:offsets[i + 1]].
+
+    def __init__(self, lines):
+        self.vocab = []
+        self.vocab_index = {}
+        self.components = []
+        self.component_index = {}
+        self.glyph_components = []
+        self._index = None
+        self._subglyph_index = None
+
+        ids = []
+        offsets = [0]
+        for line in lines:
+            ids.extend(self.intern(glyph) for glyph in line)
+            offsets.append(len(ids))
+
+        self.glyphs = np.array(ids, dtype=np.int32)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.line_ids = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(self.offsets))
+
+    @classmethod
+    def from_arrays(cls, vocab, glyphs, offsets):
+        corpus = cls([])
+        for glyph in vocab:
+            corpus.intern(str(glyph))
+        corpus.glyphs = np.asarray(glyphs, dtype=np.int32)
+        corpus.offsets = np.asarray(offsets, dtype=np.int64)
+        corpus.line_ids = np.repeat(np.arange(len(corpus.offsets) - 1, dtype=np.int32), np.diff(corpus.offsets))
+        return corpus
+
+    def intern(self, glyph):
+        glyph_id = self.vocab_index.get(glyph)
+        if glyph_id is None:
+            glyph_id = len(self.vocab)
+            self.vocab.append(glyph)
+            self.vocab_index[glyph] = glyph_id
+            components = [self.intern_component(component) for component in glyph.split('.')]
+            self.glyph_components.append(np.array(components, dtype=np.int32))
+        return glyph_id
+
+    def intern_component(self, component):
+        component_id = self.component_index.get(component)
+        if component_id is None:
+            component_id = len(self.components)
+            self.components.append(component)
+            self.component_index[component] = component_id
+        return component_id
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.decode(self.line(i))
+
+    def line(self, i):
+        return self.glyphs[self.offsets[i]:self.offsets[i + 1]]
+
+    def encode(self, glyphs):
+        return np.array([self.vocab_index.get(glyph, -1) for glyph in glyphs], dtype=np.int32)
+
+    def decode(self, ids):
+        return [self.vocab[i] for i in ids]
+
+    def to_lines(self):
+        return list(self)
+
+    def counts(self):
+        return self.index.counts
+
+    def component_matrix(self):
+        # Glyph x sub-glyph incidence matrix, one row per vocabulary entry
+        from scipy.sparse import csr_matrix
+
+        lengths = [len(components) for components in self.glyph_components]
+        indptr = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        indices = np.concatenate(self.glyph_components) if self.glyph_components else np.array([], dtype=np.int32)
+        matrix = csr_matrix(
+            (np.ones(len(indices), dtype=bool), indices, indptr),
+            shape=(len(self.vocab), len(self.components))
+        )
+        matrix.sum_duplicates()
+        return matrix
+
+    def padded(self, fill=-1):
+        # Lines as rows of a (n_lines, max_length) matrix padded with fill
+        lengths = np.diff(self.offsets)
+        matrix = np.full((len(self), lengths.max(initial=0)), fill, dtype=np.int32)
+        columns = np.arange(len(self.glyphs)) - self.offsets[self.line_ids]
+        matrix[self.line_ids, columns] = self.glyphs
+        return matrix, lengths
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = GlyphIndex(self)
+        return self._index
+
+    @property
+    def subglyph_index(self):
+        if self._subglyph_index is None:
+            self._subglyph_index = ComponentIndex(self)
+        return self._subglyph_index
+
+    def ngram_positions(self, glyph, within_lines=False):
+        # Start positions in the flat text where the glyph sequence occurs
+        return self.index.ngram_positions(self.encode(glyph), within_lines)
+
+    def ngram_count(self, glyph, within_lines=False):
+        return self.index.count(self.encode(glyph), within_lines)
+
+    def ngram_bounds(self, glyph):
+        # First and last line containing the glyph sequence
+        return self.index.bounds(self.encode(glyph))
+
+    def component_positions(self, component):
+        # Positions in the flat text of every glyph containing the sub-glyph
+        return self.subglyph_index.postings(component)
+
+    def nearest_glyphs(self, glyph, k=10):
+        return self.subglyph_index.nearest(glyph, k)
+
+
+def as_lines(data):
+    if isinstance(data, Corpus):
+        return data.to_lines()
+    return data
@@ -0,0 +1,44 @@
+import numpy as np
+
+from ruptures.base import BaseCost
+from ruptures.exceptions import NotEnoughPoints
+from scipy.sparse import issparse
+from sklearn.metrics.pairwise import cosine_similarity
+
+
+# The following class, like draw_square_on_ax in segmentation.py, is adapted from the example provided in the ruptures documentation:
+# https://centre-borelli.github.io/ruptures-docs/examples/text-segmentation/
+# by Oliver Boulant and Charles Truong
+
+class CosineCost(BaseCost):
+    model = "custom_cosine"
+    min_size = 2
+
+    def __init__(self, gram=None):
+        # gram: precomputed cosine Gram matrix of the signal rows (such as
+        # the memory-mapped one from cache.cached_gram), used instead of
+        # computing it in fit()
+        self.precomputed_gram = gram
+
+    def fit(self, signal):
+        self.signal = signal
+        if self.precomputed_gram is not None:
+            self.gram = self.precomputed_gram
+        else:
+            self.gram = cosine_similarity(signal, dense_output=False)
+        # Summed-area table of the Gram matrix and prefix sums of its
+        # diagonal, so that error() is O(1) instead of summing a submatrix
+        dense = self.gram.toarray() if issparse(self.gram) else np.asarray(self.gram)
+        n = dense.shape[0]
+        self.gram_cumsum = np.zeros((n + 1, n + 1))
+        self.gram_cumsum[1:, 1:] = dense.cumsum(axis=0).cumsum(axis=1)
+        self.diag_cumsum = np.concatenate(([0], np.cumsum(dense.diagonal())))
+        return self
+
+    def error(self, start, end) -> float:
+        if end - start < self.min_size:
+            raise NotEnoughPoints
+        S = self.gram_cumsum
+        val = self.diag_cumsum[end] - self.diag_cumsum[start]
+        val -= (S[end, end] - S[start, end] - S[end, start] + S[start, start]) / (end - start)
+        return val
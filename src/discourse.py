@@ -1,20 +1,64 @@
-import matplotlib.pyplot as plt
+import numpy as np
 
+from .corpus import Corpus
+from .profiling import profiled
 
+
+@profiled
+def occurrence_matrix(glyphs, encoded_lines):
+    # One row per glyph sequence, 1 where an occurrence starts in the text
+    corpus = encoded_lines if isinstance(encoded_lines, Corpus) else Corpus(encoded_lines)
+    occurrences = np.zeros((len(glyphs), len(corpus.glyphs)), dtype=np.float32)
+    for row, glyph in enumerate(glyphs):
+        occurrences[row, corpus.ngram_positions(glyph)] = 1
+    return occurrences
+
+
+@profiled
+def discourse_profile(glyphs, encoded_lines, window=50):
+    # Occurrences per position within a centred window, for every glyph
+    # sequence at once (a box convolution done with cumulative sums)
+    occurrences = occurrence_matrix(glyphs, encoded_lines)
+    n_glyphs, length = occurrences.shape
+    half = window // 2
+    cumulative = np.zeros((n_glyphs, length + 1), dtype=np.float64)
+    np.cumsum(occurrences, axis=1, out=cumulative[:, 1:])
+    positions = np.arange(length)
+    upper = np.minimum(positions + window - half, length)
+    lower = np.maximum(positions - half, 0)
+    return (cumulative[:, upper] - cumulative[:, lower]) / window
+
+
+def shade_breakpoint(ax, corpus, bkpt):
+    # Glyphs in lines[:bkpt], with the clamping and negative indices of a slice
+    break_x = corpus.offsets[slice(bkpt).indices(len(corpus))[1]]
+    ax.axvspan(break_x, len(corpus.glyphs), color='gray', alpha=0.1)
+
+
+def finish_plot(save_path):
+    import matplotlib.pyplot as plt
+
+    if save_path:
+        plt.savefig(save_path, bbox_inches='tight', dpi=300)
+    else:
+        plt.show()
+
+
+@profiled
 def plot_discourse(glyphs, encoded_lines, bkpt=None, figsize=(8, 6), save_path=None):
+    import matplotlib.pyplot as plt
+
     x_coords = []
     y_coords = []
     y = 0
 
-    text = []
-    for line in encoded_lines:
-        text.extend(line)
+    corpus = encoded_lines if isinstance(encoded_lines, Corpus) else Corpus(encoded_lines)
+    text = corpus.glyphs
 
     for glyph in glyphs:
-        for i in range(len(text) - len(glyph) + 1):
-            if text[i:i+len(glyph)] == glyph:
-                x_coords.append(i)
-                y_coords.append(y)
+        positions = corpus.ngram_positions(glyph)
+        x_coords.extend(positions)
+        y_coords.extend([y] * len(positions))
         y -= 1
 
     fig, ax = plt.subplots(figsize=figsize)
@@ -26,11 +70,36 @@ def plot_discourse(glyphs, encoded_lines, bkpt=None, figsize=(8, 6), save_path=N
     ax.set_ylabel('Glyph')
 
     if bkpt is not None:
-        break_x = sum([len(line) for line in encoded_lines[:bkpt]])
-        ax.axvspan(break_x, len(text), color='gray', alpha=0.1)
+        shade_breakpoint(ax, corpus, bkpt)
 
-    if save_path:
-        plt.savefig(save_path, bbox_inches='tight', dpi=300)
-    else:
-        plt.show()
+    finish_plot(save_path)
+
+
+@profiled
+def plot_discourse_heatmap(glyphs, encoded_lines, window=50, bkpt=None, figsize=(8, 6), save_path=None):
+    import matplotlib.pyplot as plt
+
+    corpus = encoded_lines if isinstance(encoded_lines, Corpus) else Corpus(encoded_lines)
+    profile = discourse_profile(glyphs, corpus, window)
+
+    fig, ax = plt.subplots(figsize=figsize)
+    im = ax.imshow(
+        profile,
+        aspect='auto',
+        cmap='Greys',
+        interpolation='nearest',
+        extent=(0, len(corpus.glyphs), len(glyphs) - 0.5, -0.5),
+        rasterized=True
+    )
+    if len(glyphs) <= 60:
+        ax.set_yticks(range(len(glyphs)))
+        ax.set_yticklabels([' '.join(glyph) for glyph in glyphs])
+    ax.set_xlabel('Position in Text')
+    ax.set_ylabel('Glyph')
+    clb = fig.colorbar(im, ax=ax)
+    clb.set_label(f'Density ({window}-glyph window)')
+
+    if bkpt is not None:
+        shade_breakpoint(ax, corpus, bkpt)
 
+    finish_plot(save_path)
@@ -0,0 +1,150 @@
+import argparse
+import hashlib
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Paper figures produced by the analysis code, with the data files each one
+# depends on. The remaining figures in figs/ are not generated from src.
+FIGURES = {
+    'figure4': ['I.csv'],
+    'figure5': ['I.csv'],
+    'figure6': ['I.csv', 'I_stanzas.txt'],
+}
+HASH_FILE = '.figure_hashes.json'
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_lines(file_path):
+    from .processing import clean_lines, encode_lines, load_file
+
+    return encode_lines(clean_lines(load_file(file_path)))
+
+
+def first_breakpoint(encoded_lines):
+    from .segmentation import compute_breakpoints, vectorize
+
+    vectorized_text, _ = vectorize(encoded_lines)
+    breakpoints, _, _ = compute_breakpoints(vectorized_text, [1])
+    return breakpoints[0][0]
+
+
+def render_figure4(data_dir, save_path):
+    from .discourse import plot_discourse
+    from .nearest_neighbor import analyze_glyphs
+
+    encoded_I_data = load_lines(os.path.join(data_dir, 'I.csv'))
+    clustered_glyphs, _ = analyze_glyphs(encoded_I_data)
+    plot_discourse(clustered_glyphs, encoded_I_data, bkpt=first_breakpoint(encoded_I_data), save_path=save_path)
+
+
+def render_figure5(data_dir, save_path):
+    from .segmentation import plot_breakpoints, vectorize
+
+    vectorized_text, _ = vectorize(load_lines(os.path.join(data_dir, 'I.csv')))
+    plot_breakpoints(vectorized_text, [1, 2], save_path=save_path)
+
+
+def render_figure6(data_dir, save_path):
+    from .collocations import get_trigram_collocations
+    from .discourse import plot_discourse
+    from .nearest_neighbor import glyph_bound
+    from .processing import process_sequences
+
+    encoded_I_data = load_lines(os.path.join(data_dir, 'I.csv'))
+    _, sequences_I = process_sequences(load_lines(os.path.join(data_dir, 'I_stanzas.txt')))
+    trigrams_I = get_trigram_collocations(sequences_I)
+    trigrams_I_frequency = get_trigram_collocations(sequences_I, measure="frequency")
+
+    trigrams_formatted = [[f'{trigram[0][0]}.76', trigram[0][2]] for trigram in trigrams_I]
+    for trigram in trigrams_I_frequency:
+        if [f'{trigram[0][0]}.76', trigram[0][2]] not in trigrams_formatted:
+            trigrams_formatted.append([f'{trigram[0][0]}.76', trigram[0][2]])
+    trigrams_sorted = sorted(trigrams_formatted, key=lambda x: glyph_bound(x, encoded_I_data))
+    plot_discourse(trigrams_sorted, encoded_I_data, bkpt=first_breakpoint(encoded_I_data), figsize=(8, 5), save_path=save_path)
+
+
+RENDERERS = {
+    'figure4': render_figure4,
+    'figure5': render_figure5,
+    'figure6': render_figure6,
+}
+
+
+def input_hash(name, data_dir):
+    # Covers the figure's data files and the analysis code, so a change to
+    # either (encoding table, cleaning rules, ...) triggers a re-render
+    digest = hashlib.sha256(name.encode('utf-8'))
+    paths = [os.path.join(data_dir, file_name) for file_name in FIGURES[name]]
+    paths += sorted(os.path.join(SRC_DIR, file_name) for file_name in os.listdir(SRC_DIR) if file_name.endswith('.py'))
+    for path in paths:
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def render(name, data_dir, save_path):
+    import matplotlib
+
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    RENDERERS[name](data_dir, save_path)
+    plt.close('all')
+    return name
+
+
+def render_figures(names=None, data_dir='data', out_dir='figs', n_jobs=None, force=False, extension='jpg'):
+    names = list(names or FIGURES)
+    hash_path = os.path.join(out_dir, HASH_FILE)
+    hashes = {}
+    if os.path.exists(hash_path):
+        with open(hash_path, 'r', encoding='utf-8') as file:
+            hashes = json.load(file)
+
+    current = {name: input_hash(name, data_dir) for name in names}
+    pending = [
+        name for name in names
+        if force or hashes.get(name) != current[name] or not os.path.exists(os.path.join(out_dir, f'{name}.{extension}'))
+    ]
+
+    os.makedirs(out_dir, exist_ok=True)
+    if pending:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [
+                executor.submit(render, name, data_dir, os.path.join(out_dir, f'{name}.{extension}'))
+                for name in pending
+            ]
+            for future in futures:
+                name = future.result()
+                hashes[name] = current[name]
+                with open(hash_path, 'w', encoding='utf-8') as file:
+                    json.dump(hashes, file, indent=2, sort_keys=True)
+
+    return pending
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the paper figures without a display.")
+    parser.add_argument('figures', nargs='*', metavar='figure', help=f"figures to render, any of {', '.join(FIGURES)} (default: all)")
+    parser.add_argument('--data', default='data', help="directory with the transcription files")
+    parser.add_argument('--out', default='figs', help="output directory")
+    parser.add_argument('--jobs', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--force', action='store_true', help="render even if the inputs are unchanged")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.figures if name not in FIGURES]
+    if unknown:
+        parser.error(f"unknown figures: {', '.join(unknown)}")
+
+    rendered = render_figures(args.figures, args.data, args.out, args.jobs, args.force)
+    skipped = [name for name in (args.figures or FIGURES) if name not in rendered]
+    for name in rendered:
+        print(f"rendered {name}")
+    for name in skipped:
+        print(f"unchanged {name}")
+
+
+if __name__ == '__main__':
+    main()
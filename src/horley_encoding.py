@@ -1,5 +1,7 @@
 import re
 
+from functools import lru_cache
+
 
 horley_encoding = {
     '1': '1',
@@ -643,8 +645,13 @@ horley_encoding = {
 }
 
 
-def convert_to_horley(glyph):
-    glyphs = re.sub("[bcdeghijkostxy!*?()\[\]]", "", glyph.lower()).split('.')
+STRIP_PATTERN = re.compile(r"[bcdeghijkostxy!*?()\[\]]")
+LETTER_PATTERN = re.compile("[a-z]")
+CACHE_SIZE = 4096
+
+
+def _encode_glyph(glyph):
+    glyphs = STRIP_PATTERN.sub("", glyph.lower()).split('.')
     clean_glyphs = []
     for gl in glyphs:
         if ':' in gl:
@@ -657,7 +664,7 @@ def convert_to_horley(glyph):
         if clean_glyph in horley_encoding:
             encoded.append(horley_encoding[clean_glyph])
         else:
-            num = re.sub("[a-z]", "", clean_glyph)
+            num = LETTER_PATTERN.sub("", clean_glyph)
             if num in horley_encoding:
                 res = horley_encoding[num]
                 if 'f' in clean_glyph:
@@ -669,3 +676,16 @@ def convert_to_horley(glyph):
                 else:
                     encoded.append('?')
     return '.'.join(encoded)
+
+
+# The corpus is dominated by a few hundred distinct tokens, so raw tokens
+# are memoized and re-encoding becomes a cache lookup per token.
+convert_to_horley = lru_cache(maxsize=CACHE_SIZE)(_encode_glyph)
+
+
+def encode_many(tokens):
+    return [convert_to_horley(token) for token in tokens]
+
+
+def encode_corpus(lines):
+    return [encode_many(line) for line in lines]
@@ -0,0 +1,144 @@
+import numpy as np
+
+
+class GlyphIndex:
+    # Positional inverted index over a Corpus: for every glyph ID, the sorted
+    # positions where it occurs in the flat text (CSR layout).
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        glyphs = corpus.glyphs
+        self.counts = np.bincount(glyphs, minlength=len(corpus.vocab))
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)))
+        self.positions = np.argsort(glyphs, kind='stable').astype(np.int64)
+
+    def postings(self, glyph_id):
+        return self.positions[self.offsets[glyph_id]:self.offsets[glyph_id + 1]]
+
+    def ngram_positions(self, ids, within_lines=False):
+        n = len(ids)
+        if n == 0 or min(ids) < 0:
+            return np.array([], dtype=np.int64)
+        positions = self.postings(ids[0])
+        for k in range(1, n):
+            if len(positions) == 0:
+                break
+            positions = np.intersect1d(positions, self.postings(ids[k]) - k, assume_unique=True)
+        if within_lines and n > 1:
+            line_ids = self.corpus.line_ids
+            positions = positions[line_ids[positions] == line_ids[positions + n - 1]]
+        return positions
+
+    def count(self, ids, within_lines=False):
+        if len(ids) == 1 and ids[0] >= 0:
+            return int(self.counts[ids[0]])
+        return len(self.ngram_positions(ids, within_lines))
+
+    def bounds(self, ids):
+        positions = self.ngram_positions(ids, within_lines=True)
+        if len(positions) == 0:
+            return (None, None)
+        line_ids = self.corpus.line_ids
+        return (int(line_ids[positions[0]]), int(line_ids[positions[-1]]))
+
+
+class ComponentIndex:
+    # Inverted index from sub-glyph component (the '.'-separated parts of a
+    # compound glyph such as 21.11) to the glyphs containing it and to their
+    # positions in the flat text, both in CSR layout.
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        matrix = corpus.component_matrix()
+        self.matrix = matrix
+        self.sizes = np.diff(matrix.indptr)
+
+        by_component = matrix.T.tocsr()
+        by_component.sort_indices()
+        self.glyph_offsets = by_component.indptr.astype(np.int64)
+        self.glyph_ids = by_component.indices.astype(np.int64)
+
+        # One entry per (position, component of the glyph there), grouped by
+        # component with positions ascending
+        glyphs = corpus.glyphs
+        lengths = self.sizes[glyphs]
+        starts = np.repeat(matrix.indptr[glyphs] - np.cumsum(lengths) + lengths, lengths)
+        components = matrix.indices[starts + np.arange(lengths.sum())]
+        order = np.argsort(components, kind='stable')
+        self.position_offsets = np.concatenate(([0], np.cumsum(np.bincount(components, minlength=len(corpus.components)))))
+        self.positions = np.repeat(np.arange(len(glyphs), dtype=np.int64), lengths)[order]
+
+    def component_id(self, component):
+        if isinstance(component, str):
+            return self.corpus.component_index.get(component, -1)
+        return component
+
+    def glyphs(self, component):
+        # IDs of the glyphs containing the component
+        component_id = self.component_id(component)
+        if component_id < 0:
+            return np.array([], dtype=np.int64)
+        return self.glyph_ids[self.glyph_offsets[component_id]:self.glyph_offsets[component_id + 1]]
+
+    def postings(self, component):
+        # Sorted positions in the flat text of any glyph containing the component
+        component_id = self.component_id(component)
+        if component_id < 0:
+            return np.array([], dtype=np.int64)
+        return self.positions[self.position_offsets[component_id]:self.position_offsets[component_id + 1]]
+
+    def vector(self, glyph):
+        # Component IDs of a glyph, and its number of components; components
+        # absent from the corpus only count towards the size
+        if isinstance(glyph, str):
+            glyph_id = self.corpus.vocab_index.get(glyph)
+            if glyph_id is None:
+                parts = set(glyph.split('.'))
+                ids = [self.corpus.component_index[part] for part in parts if part in self.corpus.component_index]
+                return np.array(sorted(ids), dtype=np.int64), len(parts)
+        else:
+            glyph_id = glyph
+        row = self.matrix.indices[self.matrix.indptr[glyph_id]:self.matrix.indptr[glyph_id + 1]]
+        return row.astype(np.int64), len(row)
+
+    def jaccard(self, glyph1, glyph2):
+        ids1, size1 = self.vector(glyph1)
+        ids2, size2 = self.vector(glyph2)
+        shared = len(np.intersect1d(ids1, ids2, assume_unique=True))
+        union = size1 + size2 - shared
+        return shared / union if union else 0.0
+
+    def similarities(self, glyph):
+        # Jaccard similarity of the glyph to every vocabulary entry
+        ids, size = self.vector(glyph)
+        shared = np.bincount(
+            np.concatenate([self.glyphs(component_id) for component_id in ids]) if len(ids) else np.array([], dtype=np.int64),
+            minlength=len(self.corpus.vocab),
+        )
+        union = self.sizes + size - shared
+        return np.divide(shared, union, out=np.zeros(len(union)), where=union > 0)
+
+    def nearest(self, glyph, k=10):
+        # The k vocabulary glyphs sharing the most components with the glyph,
+        # as (glyph, similarity), excluding the glyph itself. Ties go to the
+        # more frequent glyph, then to the earlier one in the vocabulary.
+        scores = self.similarities(glyph)
+        if isinstance(glyph, str):
+            glyph = self.corpus.vocab_index.get(glyph, -1)
+        if glyph >= 0:
+            scores[glyph] = 0
+        candidates = np.flatnonzero(scores > 0)
+        order = np.lexsort((candidates, -self.corpus.index.counts[candidates], -scores[candidates]))[:k]
+        return [(self.corpus.vocab[i], float(scores[i])) for i in candidates[order]]
+
+    def occurrences(self, component):
+        # (line, column, glyph) for every occurrence of a glyph containing
+        # the component
+        positions = self.postings(component)
+        corpus = self.corpus
+        lines = corpus.line_ids[positions]
+        columns = positions - corpus.offsets[lines]
+        return [
+            (int(line), int(column), corpus.vocab[glyph_id])
+            for line, column, glyph_id in zip(lines, columns, corpus.glyphs[positions])
+        ]
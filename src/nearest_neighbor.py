@@ -1,15 +1,40 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
-from scipy.stats import norm
+
+from .corpus import Corpus
+from .profiling import profiled
 
 
 def glyph_indices(glyph, text):
     # glyph is a list of lists
+    if isinstance(text, Corpus):
+        return text.ngram_positions(glyph).tolist()
     res = []
     for i in range(len(text) - len(glyph) + 1):
         if glyph == text[i:i + len(glyph)]:
             res.append(i)
     return res
 
+
+@lru_cache(maxsize=None)
+def critical_value(alpha):
+    # scipy.special rather than scipy.stats.norm: same values (norm.ppf and
+    # norm.sf are ndtri and ndtr underneath) at a fraction of the import cost
+    from scipy.special import ndtri
+
+    return ndtri(1 - alpha / 2)
+
+
+def two_sided_p_value(z_score):
+    # P(|Z| >= |z|) under the standard normal
+    from scipy.special import ndtr
+
+    return 2 * ndtr(-np.abs(z_score))
+
+
+@profiled
 def nearest_neighbor_analysis_1d(points, length, alpha=0.05):
     n_points = len(points)
     if n_points < 2:
@@ -24,8 +49,7 @@ def nearest_neighbor_analysis_1d(points, length, alpha=0.05):
     standard_error = sd / np.sqrt(n_points)
     z_score = (observed_mean_distance - expected_mean_distance) / standard_error
 
-    critical_value = norm.ppf(1 - alpha / 2)
-    if abs(z_score) > critical_value:
+    if abs(z_score) > critical_value(alpha):
         result = "clustered" if z_score < 0 else "dispersed"
     else:
         result = "random"
@@ -33,7 +57,137 @@ def nearest_neighbor_analysis_1d(points, length, alpha=0.05):
     return z_score, result
 
 
+NNA_DTYPE = [
+    ('count', np.int64),
+    ('mean_distance', np.float64),
+    ('expected_distance', np.float64),
+    ('nnr', np.float64),
+    ('z_score', np.float64),
+    ('p_value', np.float64),
+    ('result', 'U9'),
+]
+
+
+@profiled
+def nearest_neighbor_analysis_batch(positions, offsets, length, alpha=0.05):
+    # positions holds the sorted points of every glyph back to back, with
+    # glyph i at positions[offsets[i]:offsets[i + 1]] (CSR layout)
+    positions = np.asarray(positions, dtype=np.float64)
+    counts = np.diff(offsets)
+    n_glyphs = len(counts)
+    group = np.repeat(np.arange(n_glyphs), counts)
+
+    same_glyph = group[:-1] == group[1:]
+    gaps = np.diff(positions)[same_glyph]
+    gap_group = group[:-1][same_glyph]
+    n_gaps = counts - 1
+
+    res = np.zeros(n_glyphs, dtype=NNA_DTYPE)
+    res['count'] = counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        observed = np.bincount(gap_group, weights=gaps, minlength=n_glyphs) / n_gaps
+        deviations = gaps - observed[gap_group]
+        sd = np.sqrt(np.bincount(gap_group, weights=deviations ** 2, minlength=n_glyphs) / (n_gaps - 1))
+        expected = length / (counts + 1)
+        z_score = (observed - expected) / (sd / np.sqrt(counts))
+
+    few = counts < 2
+    observed[few] = expected[few] = z_score[few] = np.nan
+    res['mean_distance'] = observed
+    res['expected_distance'] = expected
+    res['nnr'] = observed / expected
+    res['z_score'] = z_score
+    res['p_value'] = two_sided_p_value(z_score)
+
+    significant = np.abs(z_score) > critical_value(alpha)
+    res['result'] = np.where(significant, np.where(z_score < 0, "clustered", "dispersed"), "random")
+    return res
+
+
+PERMUTATION_BUDGET = 2 ** 22
+
+
+@profiled
+def simulate_mean_distances(n_points, length, n_permutations, rng):
+    # Mean gap between n_points distinct positions drawn uniformly from
+    # range(length), for n_permutations random placements. The mean gap of
+    # a sorted sample is (max - min) / (n_points - 1). Below the birthday
+    # bound (n_points ** 2 <= length) a row of n_points draws has no repeat
+    # with probability above exp(-1/2), so only the sample is drawn and
+    # rows with a repeated position are redrawn. Denser samples pick from a
+    # shuffle of the whole text, O(length) per placement.
+    res = np.empty(n_permutations)
+    sparse = n_points * n_points <= length
+    chunk = max(1, PERMUTATION_BUDGET // (n_points if sparse else length))
+    for start in range(0, n_permutations, chunk):
+        size = min(chunk, n_permutations - start)
+        if sparse:
+            sample = np.sort(rng.integers(0, length, (size, n_points)), axis=1)
+            repeated = np.flatnonzero((np.diff(sample, axis=1) == 0).any(axis=1))
+            while len(repeated):
+                redrawn = np.sort(rng.integers(0, length, (len(repeated), n_points)), axis=1)
+                sample[repeated] = redrawn
+                repeated = repeated[(np.diff(redrawn, axis=1) == 0).any(axis=1)]
+        else:
+            sample = np.argpartition(rng.random((size, length)), n_points - 1, axis=1)[:, :n_points]
+        res[start:start + size] = (sample.max(axis=1) - sample.min(axis=1)) / (n_points - 1)
+    return res
+
+
+@profiled
+def permutation_test_1d(points, length, n_permutations=1000, alpha=0.05, seed=None):
+    n_points = len(points)
+    if n_points < 2:
+        return np.nan, np.nan, "random"
+
+    rng = np.random.default_rng(seed)
+    observed_mean_distance = np.mean(np.diff(points))
+    simulated = simulate_mean_distances(n_points, length, n_permutations, rng)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_score = (observed_mean_distance - simulated.mean()) / simulated.std(ddof=1)
+
+    p_lower = (1 + np.sum(simulated <= observed_mean_distance)) / (n_permutations + 1)
+    p_upper = (1 + np.sum(simulated >= observed_mean_distance)) / (n_permutations + 1)
+    p_value = min(1.0, 2 * min(p_lower, p_upper))
+    if p_value < alpha:
+        result = "clustered" if p_lower < p_upper else "dispersed"
+    else:
+        result = "random"
+
+    return z_score, p_value, result
+
+
+def _permutation_worker(args):
+    return permutation_test_1d(*args)
+
+
+@profiled
+def permutation_analysis_batch(positions, offsets, length, n_permutations=1000, alpha=0.05, seed=None, n_jobs=None):
+    # Same CSR input and output as nearest_neighbor_analysis_batch, with
+    # z-scores and p-values taken from random placements of each glyph.
+    # Every glyph gets its own child seed, so results do not depend on n_jobs.
+    res = nearest_neighbor_analysis_batch(positions, offsets, length, alpha)
+    seeds = np.random.SeedSequence(seed).spawn(len(res))
+    tasks = [
+        (positions[offsets[i]:offsets[i + 1]], length, n_permutations, alpha, seeds[i])
+        for i in range(len(res))
+    ]
+    if n_jobs == 1:
+        results = list(map(_permutation_worker, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_permutation_worker, tasks, chunksize=max(1, len(tasks) // 64)))
+
+    for i, (z_score, p_value, result) in enumerate(results):
+        res[i]['z_score'] = z_score
+        res[i]['p_value'] = p_value
+        res[i]['result'] = result
+    return res
+
+
 def glyph_bound(glyph, text):
+    if isinstance(text, Corpus):
+        return text.ngram_bounds(glyph)
     start = end = None
     for i, line in enumerate(text):
         for j in range(len(line) - len(glyph) + 1):
@@ -44,25 +198,38 @@ def glyph_bound(glyph, text):
     return (start, end)
 
 
-def analyze_glyphs(encoded_lines, min_count=4):
-    text = []
-    for line in encoded_lines:
-        text.extend(line)
-    unique_glyphs = {glyph for glyph in text if '?' not in glyph and text.count(glyph) >= min_count}
-    unique_glyphs = [[glyph] for glyph in unique_glyphs]
-    clustered = []
-    dispersed = []
-
-    for glyph in unique_glyphs:
-        points = glyph_indices(glyph, text)
-        _, result = nearest_neighbor_analysis_1d(points, len(text))
-        if result == "clustered":
-            clustered.append(glyph)
-        elif result == "dispersed":
-            dispersed.append(glyph)
-
-    clustered_sorted = sorted(clustered, key=lambda x: glyph_bound(x, encoded_lines))
+@profiled
+def glyph_table(encoded_lines, min_count=4, alpha=0.05, method='normal', **permutation_args):
+    corpus = encoded_lines if isinstance(encoded_lines, Corpus) else Corpus(encoded_lines)
+    index = corpus.index
+    selected = np.array(['?' not in glyph for glyph in corpus.vocab], dtype=bool) & (index.counts >= min_count)
+    glyph_ids = np.flatnonzero(selected)
+    positions = index.positions[np.repeat(selected, index.counts)]
+    offsets = np.concatenate(([0], np.cumsum(index.counts[glyph_ids])))
+
+    if method == 'permutation':
+        stats = permutation_analysis_batch(positions, offsets, len(corpus.glyphs), alpha=alpha, **permutation_args)
+    elif method == 'normal':
+        stats = nearest_neighbor_analysis_batch(positions, offsets, len(corpus.glyphs), alpha)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+    dtype = [('glyph', object), ('glyph_id', np.int32)] + NNA_DTYPE
+    res = np.zeros(len(glyph_ids), dtype=dtype)
+    res['glyph'] = [corpus.vocab[i] for i in glyph_ids]
+    res['glyph_id'] = glyph_ids
+    for name, _ in NNA_DTYPE:
+        res[name] = stats[name]
+    return res
+
+
+@profiled
+def analyze_glyphs(encoded_lines, min_count=4, method='normal', **permutation_args):
+    corpus = encoded_lines if isinstance(encoded_lines, Corpus) else Corpus(encoded_lines)
+    table = glyph_table(corpus, min_count, method=method, **permutation_args)
+    clustered = [[glyph] for glyph in table['glyph'][table['result'] == "clustered"]]
+    dispersed = [[glyph] for glyph in table['glyph'][table['result'] == "dispersed"]]
+
+    clustered_sorted = sorted(clustered, key=lambda x: glyph_bound(x, corpus))
     # clustered_formatted = [[glyph] for glyph in clustered_sorted]
 
     return clustered_sorted, dispersed
-
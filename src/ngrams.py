@@ -0,0 +1,207 @@
+import math
+from collections import Counter
+from functools import reduce
+
+import numpy as np
+
+
+SMALL = 1e-20
+# math.log rather than np.log: NumPy's SIMD log can differ from libm in the
+# last bit, which would change scores and tie-breaking relative to NLTK
+LOG = np.frompyfunc(math.log, 1, 1)
+
+
+def pad_sequence(sequence, start='<s>', end='</s>'):
+    return [start] + list(sequence) + [end]
+
+
+class NgramCounts:
+    # Unigram, bigram, skip-bigram and trigram counts over integer-encoded
+    # documents, counted once and shared by every filter and measure. n-grams
+    # never span two documents and are kept in order of first occurrence.
+
+    def __init__(self, documents, n=2):
+        if n not in (2, 3):
+            raise ValueError("Only bigrams and trigrams are supported")
+        self.n = n
+        self.vocab = []
+        self.vocab_index = {}
+
+        ids = []
+        for document in documents:
+            for token in document:
+                token_id = self.vocab_index.get(token)
+                if token_id is None:
+                    token_id = len(self.vocab)
+                    self.vocab.append(token)
+                    self.vocab_index[token] = token_id
+                ids.append(token_id)
+            ids.extend([-1] * (n - 1))
+        flat = np.array(ids, dtype=np.int64)
+        words = flat[flat >= 0]
+
+        self.size = len(self.vocab)
+        self.n_words = len(words)
+        self.unigram_counts = np.bincount(words, minlength=self.size)
+        self.bigram_keys, self.bigram_counts, bigrams = self._count(flat, (0, 1))
+        if n == 2:
+            self.ngrams, self.counts = bigrams
+        else:
+            self.wildcard_keys, self.wildcard_counts, _ = self._count(flat, (0, 2), require=(0, 1, 2))
+            _, _, (self.ngrams, self.counts) = self._count(flat, (0, 1, 2))
+
+    def _decode(self, keys, width):
+        res = []
+        for key in keys.tolist():
+            ids = []
+            for _ in range(width):
+                key, token_id = divmod(key, self.size)
+                ids.append(self.vocab[token_id])
+            res.append(tuple(reversed(ids)))
+        return res
+
+    def table(self):
+        # Plain Counters keyed by token tuples: picklable, and mergeable
+        # across tablets with merge_tables
+        table = {
+            'n': self.n,
+            'n_words': self.n_words,
+            'unigrams': Counter(dict(zip(self.vocab, self.unigram_counts.tolist()))),
+            'bigrams': Counter(dict(zip(self._decode(self.bigram_keys, 2), self.bigram_counts.tolist()))),
+            'ngrams': Counter({self.words(i): count for i, count in enumerate(self.counts.tolist())}),
+        }
+        if self.n == 3:
+            table['wildcards'] = Counter(dict(zip(self._decode(self.wildcard_keys, 2), self.wildcard_counts.tolist())))
+        return table
+
+    @classmethod
+    def from_table(cls, table):
+        counts = cls.__new__(cls)
+        counts.n = table['n']
+        counts.vocab = list(table['unigrams'])
+        counts.vocab_index = {token: i for i, token in enumerate(counts.vocab)}
+        counts.size = len(counts.vocab)
+        counts.n_words = table['n_words']
+        counts.unigram_counts = np.array(list(table['unigrams'].values()), dtype=np.int64)
+        counts.bigram_keys, counts.bigram_counts = counts._encode_keys(table['bigrams'])
+        if counts.n == 3:
+            counts.wildcard_keys, counts.wildcard_counts = counts._encode_keys(table['wildcards'])
+        counts.ngrams = np.array(
+            [[counts.vocab_index[token] for token in ngram] for ngram in table['ngrams']], dtype=np.int64
+        ).reshape(-1, counts.n)
+        counts.counts = np.array(list(table['ngrams'].values()), dtype=np.int64)
+        return counts
+
+    def _encode_keys(self, counter):
+        keys = np.array([self.vocab_index[a] * self.size + self.vocab_index[b] for a, b in counter], dtype=np.int64)
+        counts = np.array(list(counter.values()), dtype=np.int64)
+        order = np.argsort(keys)
+        return keys[order], counts[order]
+
+    def _count(self, flat, columns, require=None):
+        span = max(columns) + 1
+        length = max(len(flat) - span + 1, 0)
+        windows = [flat[k:k + length] for k in range(span)]
+        valid = np.ones(length, dtype=bool)
+        for k in require or columns:
+            valid &= windows[k] >= 0
+        keys = np.zeros(int(valid.sum()), dtype=np.int64)
+        for k in columns:
+            keys = keys * self.size + windows[k][valid]
+        unique_keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        order = np.argsort(first, kind='stable')
+        ngrams = np.stack([windows[k][valid][first[order]] for k in columns], axis=1)
+        return unique_keys, counts, (ngrams, counts[order])
+
+    def _lookup(self, keys, counts, first, second):
+        query = first * self.size + second
+        idx = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        return np.where(keys[idx] == query, counts[idx], 0)
+
+    def words(self, i):
+        return tuple(self.vocab[token_id] for token_id in self.ngrams[i])
+
+    def mask(self, ngram_filter, candidates=None):
+        # ngram_filter follows the NLTK convention: True removes the n-gram
+        if candidates is None:
+            candidates = range(len(self.counts))
+        keep = np.zeros(len(self.counts), dtype=bool)
+        for i in candidates:
+            keep[i] = not ngram_filter(*self.words(i))
+        return keep
+
+    def contingency(self, indices):
+        grams = self.ngrams[indices]
+        if self.n == 2:
+            n_ii = self.counts[indices].astype(float)
+            n_ix = self.unigram_counts[grams[:, 0]]
+            n_xi = self.unigram_counts[grams[:, 1]]
+            n_oi = n_xi - n_ii
+            n_io = n_ix - n_ii
+            return (n_ii, n_oi, n_io, self.n_words - n_ii - n_oi - n_io)
+
+        n_iii = self.counts[indices]
+        n_iix = self._lookup(self.bigram_keys, self.bigram_counts, grams[:, 0], grams[:, 1])
+        n_ixi = self._lookup(self.wildcard_keys, self.wildcard_counts, grams[:, 0], grams[:, 2])
+        n_xii = self._lookup(self.bigram_keys, self.bigram_counts, grams[:, 1], grams[:, 2])
+        n_ixx, n_xix, n_xxi = (self.unigram_counts[grams[:, k]] for k in range(3))
+        n_oii = n_xii - n_iii
+        n_ioi = n_ixi - n_iii
+        n_iio = n_iix - n_iii
+        n_ooi = n_xxi - n_iii - n_oii - n_ioi
+        n_oio = n_xix - n_iii - n_oii - n_iio
+        n_ioo = n_ixx - n_iii - n_ioi - n_iio
+        n_ooo = self.n_words - n_iii - n_oii - n_ioi - n_iio - n_ooi - n_oio - n_ioo
+        return (n_iii, n_oii, n_ioi, n_ooi, n_iio, n_oio, n_ioo, n_ooo)
+
+    def expected_values(self, cont):
+        # Same operation order as nltk.metrics.association so that scores,
+        # and therefore rankings, agree with NLTK
+        n_all = sum(cont)
+        if self.n == 2:
+            return [(cont[i] + cont[i ^ 1]) * (cont[i] + cont[i ^ 2]) / n_all for i in range(4)]
+        bits = [1 << i for i in range(self.n)]
+        return [
+            reduce(lambda x, y: x * y, (sum(cont[x] for x in range(len(cont)) if (x & j) == (i & j)) for j in bits))
+            / (n_all ** (self.n - 1))
+            for i in range(len(cont))
+        ]
+
+    def likelihood_ratio(self, indices=None):
+        # Scores for the n-grams at indices (all by default), NaN elsewhere
+        if indices is None:
+            indices = np.arange(len(self.counts))
+        cont = self.contingency(indices)
+        expected = self.expected_values(cont)
+        scores = np.full(len(self.counts), np.nan)
+        scores[indices] = 2 * sum(obs * LOG(obs / (exp + SMALL) + SMALL).astype(float) for obs, exp in zip(cont, expected))
+        return scores
+
+    def rank(self, scores, keep):
+        # Highest score first, ties broken by the n-gram's tokens as in NLTK
+        token_rank = np.empty(self.size, dtype=np.int64)
+        token_rank[sorted(range(self.size), key=self.vocab.__getitem__)] = np.arange(self.size)
+        candidates = np.flatnonzero(keep)
+        keys = [token_rank[self.ngrams[candidates, k]] for k in reversed(range(self.n))]
+        return candidates[np.lexsort(keys + [-scores[candidates]])]
+
+    def most_common(self, keep):
+        candidates = np.flatnonzero(keep)
+        return candidates[np.argsort(-self.counts[candidates], kind='stable')]
+
+
+def count_ngrams(sequences, n=2):
+    return NgramCounts([pad_sequence(sequence) for sequence in sequences], n)
+
+
+def merge_tables(tables):
+    # Counts for the pooled documents; n-grams keep their first-occurrence
+    # order across the tables in the order given
+    tables = list(tables)
+    merged = {'n': tables[0]['n'], 'n_words': sum(table['n_words'] for table in tables)}
+    for key in ('unigrams', 'bigrams', 'wildcards', 'ngrams'):
+        if key in tables[0]:
+            merged[key] = Counter()
+            for table in tables:
+                merged[key].update(table[key])
+    return merged
@@ -1,44 +1,142 @@
-from .horley_encoding import convert_to_horley
+import csv
+import os
 
+from .corpus import Corpus
+from .horley_encoding import encode_corpus, encode_many
+from .profiling import profiled
 
-def load_file(file_path):
-    if file_path[-3:] == 'csv':
-        with open(file_path, 'r', encoding='utf-8') as file:
-            raw_data = [line.split(',')[1][:-1] for line in file.readlines()]
+
+# Tablet files follow the naming of data/: <name>.csv holds the text line
+# by line, <name>_stanzas.txt the same text one stanza per line. Other files
+# (such as the name lists) are not tablets.
+TABLET_SUFFIXES = {
+    'lines': '.csv',
+    'stanzas': '_stanzas.txt',
+}
+
+
+def tablet_file(file_path):
+    # (tablet name, 'lines' or 'stanzas'), or None for other files
+    base = os.path.basename(file_path)
+    for kind, suffix in TABLET_SUFFIXES.items():
+        if base.endswith(suffix) and len(base) > len(suffix):
+            return base[:-len(suffix)], kind
+    return None
+
+
+@profiled
+def tablet_files(directory):
+    # {name: {'lines': path, 'stanzas': path}} for the tablets in a
+    # directory; a tablet may have only one of the two files
+    tablets = {}
+    for file_name in sorted(os.listdir(directory)):
+        match = tablet_file(file_name)
+        if match is not None:
+            name, kind = match
+            tablets.setdefault(name, {'lines': None, 'stanzas': None})[kind] = os.path.join(directory, file_name)
+    return tablets
+
+
+def iter_file(file_path):
+    with open(file_path, 'r', encoding='utf-8', newline='') as file:
+        if file_path.endswith('csv'):
+            # id,text rows, e.g. Ia11,430.076-021t-326-276
+            for row in csv.reader(file):
+                if row:
+                    yield row[1]
+        else:
+            for line in file:
+                yield line.rstrip('\r\n')
+
+
+def iter_records(path, kind='lines'):
+    # A directory yields the records of every tablet file of the given kind
+    if os.path.isdir(path):
+        for files in tablet_files(path).values():
+            if files[kind] is not None:
+                yield from iter_file(files[kind])
     else:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            raw_data = [line[:-1] for line in file.readlines()]
-    return raw_data
-
-
-def clean_line(line):
-    replacements = {
-        "(": "",
-        ")": "",
-        "128": "001V.076",
-        "-999": "",
-        ".076.": ".076-",
-        "-022h-": "-",
-        "-021h-": "-"
-    }
-    for old, new in replacements.items():
+        yield from iter_file(path)
+
+
+@profiled
+def load_file(file_path):
+    return list(iter_records(file_path))
+
+
+# Cleaning rules, applied one after another in table order, each over the
+# whole line. Rules cascade: a rule also sees the text produced by the ones
+# before it ('12(8)' becomes '128' and then '001V.076'), which is why the
+# table is not compiled into a single-pass regex substitution.
+REPLACEMENTS = {
+    "(": "",
+    ")": "",
+    "128": "001V.076",
+    "-999": "",
+    ".076.": ".076-",
+    "-022h-": "-",
+    "-021h-": "-"
+}
+
+
+def clean_line(line, rules=REPLACEMENTS):
+    for old, new in rules.items():
         line = line.replace(old, new)
     return line.split('-')
 
 
-def clean_lines(lines):
-    return [clean_line(line) for line in lines]
+def iter_clean(lines, rules=REPLACEMENTS):
+    for line in lines:
+        yield clean_line(line, rules)
+
+
+@profiled
+def clean_lines(lines, rules=REPLACEMENTS):
+    return list(iter_clean(lines, rules))
+
 
+def iter_encode(lines):
+    for line in lines:
+        yield encode_many(line)
 
+
+@profiled
 def encode_lines(lines):
-    return [[convert_to_horley(glyph) for glyph in line] for line in lines]
+    return encode_corpus(lines)
+
+
+def split_stanza_marker(sequence):
+    if sequence[0][-3:] == '.76':
+        sequence[0] = sequence[0][:-3]
+        sequence.insert(1, '<76>')
+    return sequence
+
 
+def is_valid_sequence(sequence):
+    return bool(sequence[0]) and len(sequence) >= 4
 
+
+def iter_sequences(sequences, filtered=True):
+    for sequence in sequences:
+        split_stanza_marker(sequence)
+        if not filtered or is_valid_sequence(sequence):
+            yield sequence
+
+
+@profiled
 def process_sequences(sequences):
     for sequence in sequences:
-        if sequence[0][-3:] == '.76':
-            sequence[0] = sequence[0][:-3]
-            sequence.insert(1, '<76>')
-    filtered_sequences = [seq for seq in sequences if seq[0] and len(seq) >= 4]
+        split_stanza_marker(sequence)
+    filtered_sequences = [seq for seq in sequences if is_valid_sequence(seq)]
     return sequences, filtered_sequences
 
+
+def stream_sequences(path, filtered=True, rules=REPLACEMENTS):
+    # Lazy load -> clean -> encode -> process_sequences over a file or a
+    # directory of tablet files
+    return iter_sequences(iter_encode(iter_clean(iter_records(path, 'stanzas'), rules)), filtered)
+
+
+@profiled
+def build_corpus(encoded_lines):
+    return Corpus(encoded_lines)
@@ -0,0 +1,147 @@
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+
+
+# Opt-in instrumentation of the analysis stages. The public stage functions
+# of processing, collocations, segmentation, nearest_neighbor and discourse
+# are decorated with @profiled, which only checks a global when no profile()
+# block is active; inside one, every call is timed as a stage.
+#
+#   with profile() as profiler:
+#       analyze_glyphs(encoded_lines)
+#   print(profiler.report())
+#   profiler.save_trace('trace.json')  # chrome://tracing / Perfetto
+#
+# Only the process that entered profile() records anything: work done in
+# worker processes (n_jobs) is seen as the time the parent spends waiting
+# for it.
+_active = None
+
+
+class Profiler:
+
+    def __init__(self, memory=True, trace=True):
+        self.memory = memory
+        self.trace = trace
+        self.stats = {}
+        self.events = []
+        self._stack = []
+        self._origin = time.perf_counter()
+
+    def enter(self, name):
+        frame = [name, time.perf_counter(), 0.0, 0, 0]
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][4] = max(self._stack[-1][4], peak)
+            tracemalloc.reset_peak()
+            frame[3] = current
+        self._stack.append(frame)
+
+    def exit(self):
+        name, start, child_time, start_memory, child_peak = self._stack.pop()
+        end = time.perf_counter()
+        elapsed = end - start
+        peak = 0
+        if self.memory:
+            peak = max(child_peak, tracemalloc.get_traced_memory()[1])
+        if self._stack:
+            self._stack[-1][2] += elapsed
+            self._stack[-1][4] = max(self._stack[-1][4], peak)
+
+        stats = self.stats.setdefault(name, {'calls': 0, 'total': 0.0, 'own': 0.0, 'peak_memory': 0})
+        stats['calls'] += 1
+        stats['total'] += elapsed
+        stats['own'] += elapsed - child_time
+        stats['peak_memory'] = max(stats['peak_memory'], peak - start_memory)
+        if self.trace:
+            self.events.append((name, start - self._origin, elapsed, len(self._stack)))
+
+    @contextmanager
+    def stage(self, name):
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def report(self, sort='total'):
+        # One row per stage; "own" excludes time spent in nested stages
+        header = f"{'stage':<48} {'calls':>8} {'total s':>10} {'own s':>10} {'mean ms':>10}"
+        if self.memory:
+            header += f" {'peak MiB':>10}"
+        lines = [header, '-' * len(header)]
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1][sort]):
+            line = (
+                f"{name:<48} {stats['calls']:>8} {stats['total']:>10.4f} {stats['own']:>10.4f} "
+                f"{1000 * stats['total'] / stats['calls']:>10.3f}"
+            )
+            if self.memory:
+                line += f" {stats['peak_memory'] / 2**20:>10.2f}"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def to_json(self):
+        # Chrome trace event format, with the per-stage summary alongside
+        pid = os.getpid()
+        return {
+            'traceEvents': [
+                {'name': name, 'ph': 'X', 'ts': 1e6 * start, 'dur': 1e6 * elapsed, 'pid': pid, 'tid': 0, 'args': {'depth': depth}}
+                for name, start, elapsed, depth in self.events
+            ],
+            'stages': self.stats,
+        }
+
+    def save_trace(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_json(), file)
+
+
+@contextmanager
+def profile(memory=True, trace=True):
+    global _active
+    if _active is not None:
+        raise RuntimeError("A profile() block is already active")
+
+    profiler = Profiler(memory, trace)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active = profiler
+    try:
+        yield profiler
+    finally:
+        _active = None
+        if started_tracing:
+            tracemalloc.stop()
+
+
+@contextmanager
+def stage(name):
+    # Marks a block as a stage of the active profile(); a no-op otherwise
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+
+def profiled(func=None, name=None):
+    # Times each call as a stage of the active profile(). Costs one global
+    # lookup per call when no profile() block is active.
+    if func is None:
+        return functools.partial(profiled, name=name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+        with _active.stage(name or f'{func.__module__.rpartition(".")[2]}.{func.__name__}'):
+            return func(*args, **kwargs)
+
+    return wrapper
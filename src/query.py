@@ -0,0 +1,153 @@
+import numpy as np
+
+from .corpus import Corpus
+
+
+# Stanza pattern queries over encoded sequences, e.g. "^ X <76> _ * X $".
+# Tokens are separated by spaces:
+#   _       any single glyph
+#   *       any run of glyphs, possibly empty
+#   ^ / $   anchor to the start / end of the sequence (first / last token)
+#   X       single capital letter: a variable; later uses of the same
+#           variable must share a sub-glyph with the first (as is_similar)
+#   ~76     any glyph with sub-glyph 76 among its '.'-separated components
+#   other   a literal glyph, e.g. 600, 90.76, <76> or ?
+# A pattern is compiled once per corpus into per-step lookup tables over
+# glyph IDs; patterns without * are then matched for all positions at once.
+
+
+def parse_pattern(pattern):
+    tokens = pattern.split()
+    anchor_start = bool(tokens) and tokens[0] == '^'
+    anchor_end = bool(tokens) and tokens[-1] == '$'
+    tokens = tokens[int(anchor_start):len(tokens) - int(anchor_end)]
+    if not tokens:
+        raise ValueError(f"Empty pattern: {pattern!r}")
+
+    steps = []
+    for token in tokens:
+        if token == '_':
+            steps.append(('any', None))
+        elif token == '*':
+            steps.append(('star', None))
+        elif len(token) == 1 and token.isupper():
+            steps.append(('var', token))
+        elif token.startswith('~') and len(token) > 1:
+            steps.append(('component', token[1:]))
+        elif token in ('^', '$'):
+            raise ValueError(f"Anchors must be at the ends of the pattern: {pattern!r}")
+        else:
+            steps.append(('glyph', token))
+    return steps, anchor_start, anchor_end
+
+
+class StanzaQuery:
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.steps, self.anchor_start, self.anchor_end = parse_pattern(pattern)
+        self.has_star = any(kind == 'star' for kind, _ in self.steps)
+
+    def compile(self, corpus):
+        # One boolean table over the vocabulary per step; variables keep
+        # the index of the step that binds them
+        n_vocab = len(corpus.vocab)
+        tables = []
+        bound = {}
+        for k, (kind, value) in enumerate(self.steps):
+            if kind == 'glyph':
+                table = np.zeros(n_vocab, dtype=bool)
+                if value in corpus.vocab_index:
+                    table[corpus.vocab_index[value]] = True
+            elif kind == 'component':
+                table = np.zeros(n_vocab, dtype=bool)
+                table[corpus.subglyph_index.glyphs(value)] = True
+            elif kind == 'var' and value in bound:
+                table = bound[value]
+            elif kind == 'var':
+                bound[value] = k
+                table = None
+            else:
+                table = None
+            tables.append(table)
+        return tables
+
+    def search(self, sequences):
+        # Returns (sequence index, start, end) for every match, with end
+        # exclusive; patterns without * report every matching start
+        corpus = sequences if isinstance(sequences, Corpus) else Corpus(sequences)
+        tables = self.compile(corpus)
+        if self.has_star:
+            return self._search_backtracking(corpus, tables)
+        return self._search_fixed(corpus, tables)
+
+    def _similar(self, components, first, other):
+        return np.asarray(components[first].multiply(components[other]).sum(axis=1)).ravel() > 0
+
+    def _search_fixed(self, corpus, tables):
+        n = len(self.steps)
+        glyphs = corpus.glyphs
+        starts = np.arange(max(len(glyphs) - n + 1, 0))
+        line_ids = corpus.line_ids
+        keep = line_ids[starts] == line_ids[starts + n - 1] if len(starts) else np.zeros(0, dtype=bool)
+        if self.anchor_start:
+            keep &= starts == corpus.offsets[line_ids[starts]]
+        if self.anchor_end:
+            keep &= starts + n == corpus.offsets[line_ids[starts] + 1]
+        starts = starts[keep]
+
+        variables = []
+        for k, table in enumerate(tables):
+            if isinstance(table, np.ndarray):
+                starts = starts[table[glyphs[starts + k]]]
+            elif isinstance(table, int):
+                variables.append((table, k))
+        if variables:
+            components = corpus.component_matrix()
+            for first, k in variables:
+                starts = starts[self._similar(components, glyphs[starts + first], glyphs[starts + k])]
+
+        lines = line_ids[starts]
+        line_starts = starts - corpus.offsets[lines]
+        return [(int(line), int(start), int(start) + n) for line, start in zip(lines, line_starts)]
+
+    def _search_backtracking(self, corpus, tables):
+        components = [set(row) for row in corpus.component_matrix().tolil().rows]
+        n_steps = len(self.steps)
+        res = []
+
+        def match(line, step, pos, bindings):
+            if step == n_steps:
+                return pos if not self.anchor_end or pos == len(line) else None
+            kind, value = self.steps[step]
+            table = tables[step]
+            if kind == 'star':
+                for end in range(pos, len(line) + 1):
+                    found = match(line, step + 1, end, bindings)
+                    if found is not None:
+                        return found
+                return None
+            if pos >= len(line):
+                return None
+            glyph = line[pos]
+            if isinstance(table, np.ndarray):
+                if not table[glyph]:
+                    return None
+            elif isinstance(table, int):
+                if not components[bindings[table]] & components[glyph]:
+                    return None
+            bindings[step] = glyph
+            return match(line, step + 1, pos + 1, bindings)
+
+        for i in range(len(corpus)):
+            line = corpus.line(i)
+            starts = [0] if self.anchor_start else range(len(line))
+            for start in starts:
+                end = match(line, 0, start, {})
+                if end is not None:
+                    res.append((i, start, end))
+        return res
+
+
+def find_stanzas(pattern, sequences):
+    return StanzaQuery(pattern).search(sequences)
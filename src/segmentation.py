@@ -1,21 +1,40 @@
-import matplotlib.pyplot as plt
 import numpy as np
-import ruptures as rpt
 
-from matplotlib.colors import LogNorm
-from ruptures.base import BaseCost
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
+from .corpus import as_lines
+from .profiling import profiled
+from .vectorization import fit_vectorizer, segment_counts
 
 
-def vectorize(lines, vectorizer_class=CountVectorizer):
-    line_str = [' '.join(line) for line in lines]
-    vectorizer = CountVectorizer(analyzer="word", token_pattern='[0-9]+[a-zAZ]*[.0-9]*[a-zAZ]*')
-    vectorized_text = vectorizer.fit_transform(line_str)
-    return vectorized_text, vectorizer
+# ruptures and scikit-learn take most of a second to import, so they are
+# only loaded once a segmentation is actually computed. CosineCost lives in
+# costs.py and is still importable from here.
+def __getattr__(name):
+    if name == 'CosineCost':
+        from .costs import CosineCost
 
+        return CosineCost
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
+
+@profiled
+def vectorize(lines, vectorizer_class=None):
+    # vectorizer_class selects counts (CountVectorizer, the default) or
+    # TF-IDF weights (TfidfVectorizer). The vectorizer returned is a copy of
+    # the cached one: get_feature_names_out(), vocabulary_ and transform()
+    # are available, but the sklearn fit()/fit_transform() are not.
+    vectorizer = fit_vectorizer(lines).copy()
+    vectorized_text = vectorizer.counts
+    if vectorizer_class is not None:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        if vectorizer_class is TfidfVectorizer:
+            vectorized_text = vectorizer.tfidf()
+    return vectorized_text.copy(), vectorizer
+
+
+@profiled
 def segment_text(encoded_text, breakpoints):
+    encoded_text = as_lines(encoded_text)
     breakpoints = [0] + breakpoints
     segments = []
     for i in range(len(breakpoints) - 1):
@@ -23,41 +42,52 @@ def segment_text(encoded_text, breakpoints):
     return segments
 
 
-def get_distinctive_glyphs(segmented_text, top_n=10):
-    vectorizer = TfidfVectorizer(analyzer="word", token_pattern='[0-9]+[a-zAZ]*[.0-9]*[a-zAZ]*')
-    vectorized_text = vectorizer.fit_transform(segmented_text)
-    feature_names = vectorizer.get_feature_names_out()
-    distinctive_features = []
-    for i in range(vectorized_text.shape[0]):
-        tfidf_scores = vectorized_text[i].toarray().flatten()
-        feature_score_pairs = list(zip(feature_names, tfidf_scores))
-        sorted_features = sorted(feature_score_pairs, key=lambda x: x[1], reverse=True)
-        sorted_feature_names = [feature for feature, score in sorted_features if score > 0]
-        distinctive_features.append(sorted_feature_names[:top_n])
+@profiled
+def get_distinctive_glyphs(segmented_text, top_n=10, return_scores=False):
+    # Segments may be space-joined strings (as from segment_text) or glyph lists
+    documents = [segment.split() if isinstance(segment, str) else segment for segment in segmented_text]
+    vectorizer = fit_vectorizer(documents)
+    return top_features(vectorizer.tfidf(), vectorizer.get_feature_names_out(), top_n, return_scores)
+
+
+@profiled
+def get_segment_distinctive_glyphs(lines, breakpoints, top_n=10, return_scores=False):
+    # Segment counts are summed from the cached line counts, so trying other
+    # breakpoints does not tokenize the text again
+    from sklearn.feature_extraction.text import TfidfTransformer
+
+    vectorizer = fit_vectorizer(lines)
+    vectorized_text = TfidfTransformer().fit_transform(segment_counts(vectorizer.counts, breakpoints).astype(np.float64))
+    return top_features(vectorized_text, vectorizer.get_feature_names_out(), top_n, return_scores)
+
+
+@profiled
+def top_features(vectorized_text, feature_names, top_n=10, return_scores=False):
+    # Ranks the stored (non-zero) CSR entries of all rows in one sort,
+    # by row, then score descending, then feature order as before
+    vectorized_text = vectorized_text.tocsr()
+    n_rows = vectorized_text.shape[0]
+    rows = np.repeat(np.arange(n_rows), np.diff(vectorized_text.indptr))
+    keep = vectorized_text.data > 0
+    rows = rows[keep]
+    scores = vectorized_text.data[keep]
+    indices = vectorized_text.indices[keep]
+
+    order = np.lexsort((indices, -scores, rows))
+    rows, scores, indices = rows[order], scores[order], indices[order]
+    row_start = np.searchsorted(rows, np.arange(n_rows))
+    top = np.arange(len(rows)) - row_start[rows] < top_n
+    rows, scores, indices = rows[top], scores[top], indices[top]
+
+    distinctive_features = [[] for _ in range(n_rows)]
+    for row, score, j in zip(rows, scores, indices):
+        distinctive_features[row].append((feature_names[j], float(score)) if return_scores else feature_names[j])
     return distinctive_features
 
-# The following class and function are adapted from the example provided in the ruptures documentation:
+# The following function, like CosineCost in costs.py, is adapted from the example provided in the ruptures documentation:
 # https://centre-borelli.github.io/ruptures-docs/examples/text-segmentation/
 # by Oliver Boulant and Charles Truong
 
-class CosineCost(BaseCost):
-    model = "custom_cosine"
-    min_size = 2
-
-    def fit(self, signal):
-        self.signal = signal
-        self.gram = cosine_similarity(signal, dense_output=False)
-        return self
-
-    def error(self, start, end) -> float:
-        if end - start < self.min_size:
-            raise NotEnoughPoints
-        sub_gram = self.gram[start:end, start:end]
-        val = sub_gram.diagonal().sum()
-        val -= sub_gram.sum() / (end - start)
-        return val
-
-
 def draw_square_on_ax(start, end, ax, linewidth=1.2, color="white"):
     ax.vlines(
         x=[start - 0.5, end - 0.5],
@@ -76,9 +106,108 @@ def draw_square_on_ax(start, end, ax, linewidth=1.2, color="white"):
     return ax
 
 
-def plot_breakpoints(vectorized_text, n_bkps, save_path=None):
-    X = vectorized_text.toarray()
-    algo = rpt.Dynp(custom_cost=CosineCost(), min_size=1, jump=2).fit(X)
+@profiled
+def compute_breakpoints(vectorized_text, n_bkps, jump=2, gram=None):
+    # A single Dynp instance serves every requested count, so the memoized
+    # sub-segmentations are shared between them. gram optionally supplies
+    # the cosine Gram matrix of vectorized_text (e.g. from the cache).
+    import ruptures as rpt
+
+    from .costs import CosineCost
+
+    algo = rpt.Dynp(custom_cost=CosineCost(gram), min_size=1, jump=jump).fit(vectorized_text)
+    breakpoints = [algo.predict(n_bkps=n) for n in n_bkps]
+    costs = [algo.cost.sum_of_costs(bkps) for bkps in breakpoints]
+    # Dynp memoizes on the class, which would keep this instance alive
+    algo.seg.cache_clear()
+    return breakpoints, costs, algo.cost
+
+
+# Names of the ruptures search classes
+SEARCH_METHODS = {
+    'pelt': 'Pelt',
+    'binseg': 'Binseg',
+}
+
+SWEEP_DTYPE = [
+    ('penalty', np.float64),
+    ('n_bkps', np.int64),
+    ('cost', np.float64),
+]
+
+
+def elbow_index(x, y):
+    # Point of the curve furthest from the chord joining its end points
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) < 3:
+        return 0
+    x_range = np.ptp(x) or 1.0
+    y_range = np.ptp(y) or 1.0
+    x_norm = (x - x.min()) / x_range
+    y_norm = (y - y.min()) / y_range
+    dx = x_norm[-1] - x_norm[0]
+    dy = y_norm[-1] - y_norm[0]
+    distance = np.abs(dy * (x_norm - x_norm[0]) - dx * (y_norm - y_norm[0]))
+    return int(np.argmax(distance))
+
+
+def unsegmented_sweep(cost):
+    sweep = np.zeros(1, dtype=SWEEP_DTYPE)
+    sweep['cost'] = cost
+    return sweep
+
+
+@profiled
+def compute_penalized_breakpoints(vectorized_text, penalties=None, method='pelt', jump=2):
+    # Penalized search (PELT or binary segmentation) with the same cosine
+    # cost as Dynp. The number of breakpoints is picked at the elbow of the
+    # cost curve over a sweep of penalties.
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    import ruptures as rpt
+
+    from .costs import CosineCost
+
+    n_lines = vectorized_text.shape[0]
+    if n_lines < CosineCost.min_size:
+        # Too short to have a cost, let alone a breakpoint
+        return [n_lines], unsegmented_sweep(0.0)
+
+    algo = getattr(rpt, SEARCH_METHODS[method])(custom_cost=CosineCost(), min_size=1, jump=jump).fit(vectorized_text)
+    if penalties is None:
+        total_cost = algo.cost.error(0, n_lines)
+        if total_cost <= 0:
+            # Identical lines: no split can lower the cost
+            return [n_lines], unsegmented_sweep(total_cost)
+        penalties = np.geomspace(total_cost * 1e-3, total_cost, 20)
+
+    breakpoints = [algo.predict(pen=pen) for pen in penalties]
+    if method == 'binseg':
+        algo.single_bkp.cache_clear()
+
+    sweep = np.zeros(len(penalties), dtype=SWEEP_DTYPE)
+    sweep['penalty'] = penalties
+    sweep['n_bkps'] = [len(bkps) - 1 for bkps in breakpoints]
+    sweep['cost'] = [algo.cost.sum_of_costs(bkps) for bkps in breakpoints]
+
+    # Several penalties can give the same segmentation; take the elbow over
+    # the distinct breakpoint counts
+    n_bkps, first = np.unique(sweep['n_bkps'], return_index=True)
+    chosen = first[elbow_index(n_bkps, sweep['cost'][first])]
+    return breakpoints[chosen], sweep
+
+
+@profiled
+def plot_gram(gram, n_bkps, breakpoints, save_path=None):
+    import matplotlib.pyplot as plt
+    import ruptures as rpt
+
+    from matplotlib.colors import LogNorm
+    from scipy.sparse import issparse
+
+    gram = gram.toarray() if issparse(gram) else gram
+    n_lines = gram.shape[0]
 
     num_cols = min(len(n_bkps), 2)
     num_rows = (len(n_bkps) + num_cols - 1) // num_cols
@@ -91,22 +220,18 @@ def plot_breakpoints(vectorized_text, n_bkps, save_path=None):
     else:
         axes = [axes]
 
-    res = []
-    for idx, n in enumerate(n_bkps):
-        predicted_bkps = algo.predict(n_bkps=n)
-        res.append(predicted_bkps)
-
+    for idx, (n, predicted_bkps) in enumerate(zip(n_bkps, breakpoints)):
         title_fontsize = 12
         ax = axes[idx]
-        im = ax.imshow(algo.cost.gram, cmap="viridis", norm=LogNorm(), interpolation="none")
+        im = ax.imshow(gram, cmap="viridis", norm=LogNorm(), interpolation="none")
 
         for start, end in rpt.utils.pairwise([0] + predicted_bkps):
             draw_square_on_ax(start=start, end=end, ax=ax, color="white")
         ax.set_title(f"n breakpoints={n}", fontsize=title_fontsize)
-        ax.set_xticks([i for i in range(X.shape[0])])
-        ax.set_xticklabels([i + 1 for i in range(X.shape[0])])
-        ax.set_yticks([i for i in range(X.shape[0])])
-        ax.set_yticklabels([i + 1 for i in range(X.shape[0])])
+        ax.set_xticks([i for i in range(n_lines)])
+        ax.set_xticklabels([i + 1 for i in range(n_lines)])
+        ax.set_yticks([i for i in range(n_lines)])
+        ax.set_yticklabels([i + 1 for i in range(n_lines)])
         ax.set_xlabel("line")
         ax.set_ylabel("line")
         # Add a single colorbar to the figure
@@ -120,4 +245,9 @@ def plot_breakpoints(vectorized_text, n_bkps, save_path=None):
     else:
         plt.show()
 
-    return res
+
+@profiled
+def plot_breakpoints(vectorized_text, n_bkps, save_path=None):
+    breakpoints, _, cost = compute_breakpoints(vectorized_text, n_bkps)
+    plot_gram(cost.gram, n_bkps, breakpoints, save_path)
+    return breakpoints
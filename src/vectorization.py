@@ -0,0 +1,121 @@
+import copy
+import hashlib
+import re
+
+from functools import lru_cache
+
+import numpy as np
+
+from scipy.sparse import csr_matrix
+
+from .corpus import as_lines
+
+
+# Same tokenization as the CountVectorizer/TfidfVectorizer previously used
+# on the space-joined lines, applied once per distinct glyph
+TOKEN_PATTERN = re.compile('[0-9]+[a-zAZ]*[.0-9]*[a-zAZ]*')
+CACHE_SIZE = 32
+
+_matrix_cache = {}
+
+
+@lru_cache(maxsize=None)
+def glyph_tokens(glyph):
+    return tuple(TOKEN_PATTERN.findall(glyph.lower()))
+
+
+def corpus_hash(documents):
+    digest = hashlib.sha1()
+    for document in documents:
+        digest.update('\x1f'.join(document).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+class GlyphVectorizer:
+    # Document-term counts built straight from tokenized glyph lists, with
+    # the vocabulary sorted like sklearn's vectorizers
+
+    def __init__(self, documents):
+        glyph_index = {}
+        rows = []
+        cols = []
+        for i, document in enumerate(documents):
+            for glyph in document:
+                for token in glyph_tokens(glyph):
+                    cols.append(glyph_index.setdefault(token, len(glyph_index)))
+                    rows.append(i)
+
+        features = sorted(glyph_index)
+        remap = np.empty(len(features), dtype=np.int64)
+        remap[[glyph_index[feature] for feature in features]] = np.arange(len(features))
+
+        self.vocabulary_ = {feature: i for i, feature in enumerate(features)}
+        self.feature_names = np.array(features, dtype=object)
+        self.counts = csr_matrix(
+            (np.ones(len(cols), dtype=np.int64), (np.array(rows, dtype=np.int64), remap[np.array(cols, dtype=np.int64)])),
+            shape=(len(documents), len(features)),
+        )
+        self.counts.sum_duplicates()
+        self._tfidf = None
+
+    def get_feature_names_out(self):
+        return self.feature_names
+
+    def transform(self, documents):
+        # Counts of new documents over the fitted vocabulary, like
+        # CountVectorizer.transform; unknown tokens are ignored
+        documents = list(as_lines(documents))
+        rows = []
+        cols = []
+        for i, document in enumerate(documents):
+            for glyph in document:
+                for token in glyph_tokens(glyph):
+                    col = self.vocabulary_.get(token)
+                    if col is not None:
+                        cols.append(col)
+                        rows.append(i)
+        counts = csr_matrix(
+            (np.ones(len(cols), dtype=np.int64), (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64))),
+            shape=(len(documents), len(self.feature_names)),
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def copy(self):
+        # Independent of the instance kept in _matrix_cache
+        vectorizer = copy.copy(self)
+        vectorizer.vocabulary_ = dict(self.vocabulary_)
+        vectorizer.feature_names = self.feature_names.copy()
+        vectorizer.counts = self.counts.copy()
+        if self._tfidf is not None:
+            vectorizer._tfidf = self._tfidf.copy()
+        return vectorizer
+
+    def tfidf(self):
+        if self._tfidf is None:
+            from sklearn.feature_extraction.text import TfidfTransformer
+
+            self._tfidf = TfidfTransformer().fit_transform(self.counts.astype(np.float64))
+        return self._tfidf
+
+
+def fit_vectorizer(documents):
+    documents = [list(document) for document in as_lines(documents)]
+    key = corpus_hash(documents)
+    vectorizer = _matrix_cache.pop(key, None)
+    if vectorizer is None:
+        vectorizer = GlyphVectorizer(documents)
+    _matrix_cache[key] = vectorizer
+    while len(_matrix_cache) > CACHE_SIZE:
+        del _matrix_cache[next(iter(_matrix_cache))]
+    return vectorizer
+
+
+def segment_counts(counts, breakpoints):
+    # Sum line rows into one row per segment ending at each breakpoint
+    bounds = np.array([0] + list(breakpoints))
+    segment_ids = np.repeat(np.arange(len(bounds) - 1), np.diff(bounds))
+    n_rows = bounds[-1]
+    indicator = csr_matrix((np.ones(n_rows), (segment_ids, np.arange(n_rows))), shape=(len(bounds) - 1, counts.shape[0]))
+    return (indicator @ counts).astype(counts.dtype)
@@ -0,0 +1,52 @@
+import glob
+import os
+
+import pytest
+
+from nltk.collocations import BigramAssocMeasures, BigramCollocationFinder, TrigramAssocMeasures, TrigramCollocationFinder
+from nltk.lm.preprocessing import pad_both_ends
+
+from src.collocations import BIGRAM_FILTERS, TRIGRAM_FILTERS, get_bigram_collocations, get_trigram_collocations
+from src.processing import clean_lines, encode_lines, load_file, process_sequences
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+STANZA_FILES = sorted(glob.glob(os.path.join(DATA_DIR, '*_stanzas.txt')))
+
+
+def nltk_collocations(sequences, finder_class, measures_class, ngram_filters, measure, top_n):
+    # The NLTK implementation the counting code replaced, kept as the reference
+    padded = [list(pad_both_ends(sequence, 2)) for sequence in sequences]
+    results = []
+    for ngram_filter in ngram_filters:
+        finder = finder_class.from_documents(padded)
+        finder.apply_freq_filter(2)
+        finder.apply_ngram_filter(ngram_filter)
+        if measure == 'likelihood_ratio':
+            results.extend(finder.score_ngrams(measures_class().likelihood_ratio)[:top_n])
+        elif measure == 'frequency':
+            results.extend(finder.ngram_fd.most_common(top_n))
+    return results
+
+
+def load_sequences(path):
+    _, sequences = process_sequences(encode_lines(clean_lines(load_file(path))))
+    return sequences
+
+
+@pytest.mark.parametrize('measure', ['likelihood_ratio', 'frequency'])
+@pytest.mark.parametrize('top_n', [10, 1000])
+@pytest.mark.parametrize('path', STANZA_FILES, ids=os.path.basename)
+def test_bigrams_match_nltk(path, top_n, measure):
+    sequences = load_sequences(path)
+    expected = nltk_collocations(sequences, BigramCollocationFinder, BigramAssocMeasures, BIGRAM_FILTERS, measure, top_n)
+    assert get_bigram_collocations(sequences, measure, top_n) == expected
+
+
+@pytest.mark.parametrize('measure', ['likelihood_ratio', 'frequency'])
+@pytest.mark.parametrize('top_n', [10, 1000])
+@pytest.mark.parametrize('path', STANZA_FILES, ids=os.path.basename)
+def test_trigrams_match_nltk(path, top_n, measure):
+    sequences = load_sequences(path)
+    expected = nltk_collocations(sequences, TrigramCollocationFinder, TrigramAssocMeasures, TRIGRAM_FILTERS, measure, top_n)
+    assert get_trigram_collocations(sequences, measure, top_n) == expected
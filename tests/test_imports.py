@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.import_time import HEAVY_MODULES
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# costs.py holds the ruptures cost and is only imported once a
+# segmentation runs; __main__ runs the batch command line
+EAGER_MODULES = {'costs', '__main__'}
+MODULES = sorted(
+    f'src.{name[:-3]}' for name in os.listdir(os.path.join(ROOT, 'src'))
+    if name.endswith('.py') and name[:-3] not in EAGER_MODULES
+)
+PROBE = "import json, sys; import {module}; print(json.dumps([name for name in {heavy!r} if name in sys.modules]))"
+
+
+@pytest.mark.parametrize('module', MODULES)
+def test_import_loads_no_heavy_dependency(module):
+    # Timing is left to benchmarks/import_time.py; this only checks that
+    # the heavy dependencies stay lazy
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True, cwd=ROOT,
+    ).stdout
+    assert json.loads(output) == []
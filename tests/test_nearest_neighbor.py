@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from src.nearest_neighbor import permutation_test_1d, simulate_mean_distances
+
+
+@pytest.mark.parametrize('n_points, length', [(5, 1000), (31, 1000), (300, 1000), (900, 1000)])
+def test_simulated_mean_distance_is_unbiased(n_points, length):
+    # The range of n distinct uniform positions has mean (L + 1)(n - 1)/(n + 1)
+    simulated = simulate_mean_distances(n_points, length, 2000, np.random.default_rng(0))
+    expected = (length + 1) / (n_points + 1)
+    assert simulated.mean() == pytest.approx(expected, rel=0.02)
+
+
+def test_permutation_test_dense_glyph():
+    # A glyph covering about 30% of the text
+    rng = np.random.default_rng(0)
+    length = 2000
+    points = np.sort(rng.choice(length, 600, replace=False))
+    z_score, p_value, result = permutation_test_1d(points, length, n_permutations=200, seed=0)
+    assert np.isfinite(z_score)
+    assert 0 < p_value <= 1
+    assert result in ('clustered', 'dispersed', 'random')
@@ -0,0 +1,28 @@
+import pytest
+
+from src.processing import clean_line
+
+
+@pytest.mark.parametrize('line, expected', [
+    # '(' and ')' go first, so the uncovered 128 is then rewritten
+    ('12(8)', ['001V.076']),
+    # ... and the .076. it produces is split by a later rule
+    ('128.5', ['001V.076', '5']),
+    ('001-022h-021h-002', ['001', '002']),
+    ('1-(999)', ['1']),
+    ('1-999-2', ['1', '2']),
+    ('430.076.021t-326', ['430.076', '021t', '326']),
+    ('(076.)076-092f', ['076.076', '092f']),
+    # Replacements do not overlap, so the second -022h- survives
+    ('-022h-022h-', ['', '022h', '']),
+    ('001V.076.076.-999h', ['001V.076', '076.h']),
+    ('', ['']),
+])
+def test_clean_line(line, expected):
+    assert clean_line(line) == expected
+
+
+def test_clean_line_custom_rules_apply_in_order():
+    assert clean_line('abb', {'ab': 'b', 'bb': 'c'}) == ['c']
+    assert clean_line('abb', {'bb': 'c', 'ab': 'b'}) == ['ac']
+    assert clean_line('x-y', {}) == ['x', 'y']
@@ -0,0 +1,37 @@
+import numpy as np
+
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src.segmentation import vectorize
+from src.vectorization import TOKEN_PATTERN
+
+
+LINES = [
+    ['001', '022h', '021h', '002'],
+    ['430.076', '021t', '326', '001'],
+    ['200.6', '6', '022h?'],
+]
+NEW_LINES = [
+    ['001', '999x', '430.076'],
+    [],
+    ['6', '6', '021t'],
+]
+
+
+def test_transform_matches_count_vectorizer():
+    _, vectorizer = vectorize(LINES)
+    reference = CountVectorizer(token_pattern=TOKEN_PATTERN.pattern).fit([' '.join(line) for line in LINES])
+    assert list(vectorizer.get_feature_names_out()) == list(reference.get_feature_names_out())
+    expected = reference.transform([' '.join(line) for line in NEW_LINES]).toarray()
+    np.testing.assert_array_equal(vectorizer.transform(NEW_LINES).toarray(), expected)
+
+
+def test_vectorize_returns_independent_vectorizer():
+    vectorized_text, vectorizer = vectorize(LINES)
+    vectorizer.counts.data[:] = 0
+    vectorizer.vocabulary_.clear()
+    again, other = vectorize(LINES)
+    assert other is not vectorizer
+    np.testing.assert_array_equal(again.toarray(), vectorized_text.toarray())
+    np.testing.assert_array_equal(other.counts.toarray(), vectorized_text.toarray())
+    assert other.vocabulary_